@@ -2,20 +2,27 @@ import logging
 import hmac
 import hashlib
 import base64
-from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.responses import JSONResponse
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple, Type, TypeVar
+from fastapi import FastAPI, Request, Response, HTTPException, status
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from config import config
-from typess import IncomingJob, Platforms, CallbackPayload
-from llm import generate_variants
-from images import choose_or_create_image
-
-# Import publishers
-from publishers.twitter import post_to_twitter
-from publishers.linkedin import post_to_linkedin
-from publishers.facebook import post_to_facebook
-from publishers.pinterest import post_to_pinterest
-from publishers.tumblr import post_to_tumblr
+from typess import IncomingJob, JobCheckpoint, JobStatus
+from jobs import job_queue, QueueFullError
+from journal import journal
+from outbox import outbox
+from publishing import publish_queues
+from utils.http import init_client, close_client, rate_limiter, circuit_breakers
+from utils.clients import close_openai_clients
+from utils.codec import decode, ValidationError
+from utils import metrics, tracing
+from media import close_media, media_cache
+from images import image_cache
+from llm import variant_cache
 
 # Configure logging
 logging.basicConfig(
@@ -24,10 +31,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+CACHES = {"llm": variant_cache, "media": media_cache, "image": image_cache}
+
+metrics.registry.register(metrics.Gauge(
+    "jobs_in_flight",
+    "Jobs accepted and not yet finished, by state.",
+    lambda: job_queue.count_by_state(),
+    ("state",)
+))
+metrics.registry.register(metrics.Gauge(
+    "job_queue_depth",
+    "Jobs waiting for a worker, by lane.",
+    lambda: {(lane,): depth for lane, depth in job_queue.depth().items()},
+    ("lane",)
+))
+metrics.registry.register(metrics.Gauge(
+    "publish_queue_depth",
+    "Posts waiting for a publish worker, by platform.",
+    lambda: {(platform,): depth for platform, depth in publish_queues.depth().items()},
+    ("platform",)
+))
+metrics.registry.register(metrics.Gauge(
+    "publish_in_flight",
+    "Posts being published, by platform.",
+    lambda: {(platform,): stats["running"] for platform, stats in publish_queues.stats().items()},
+    ("platform",)
+))
+metrics.registry.register(metrics.Gauge(
+    "callbacks_pending",
+    "Callbacks waiting in the outbox, by destination.",
+    lambda: {(url,): stats["pending"] for url, stats in outbox.stats().items()},
+    ("url",)
+))
+for name, field, kind, documentation in (
+    ("cache_hits_total", "hits", "counter", "Cache hits by cache."),
+    ("cache_misses_total", "misses", "counter", "Cache misses by cache."),
+    ("cache_hit_ratio", "hitRatio", "gauge", "Share of cache lookups that hit, by cache.")
+):
+    metrics.registry.register(metrics.Gauge(
+        name,
+        documentation,
+        lambda field=field: {(cache_name,): cache.stats()[field] for cache_name, cache in CACHES.items()},
+        ("cache",),
+        kind=kind
+    ))
+
+async def resume_jobs(restored: List[Tuple[IncomingJob, JobStatus, JobCheckpoint]]) -> None:
+    """Requeue jobs that were interrupted by a restart."""
+    for job, progress, checkpoint in restored:
+        logger.info(f"Resuming job {job['runId']} from journal")
+        await job_queue.resume(job, progress, checkpoint)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown."""
+    await init_client()
+    tracing.start_exporter()
+    unfinished = await journal.start() if config.JOURNAL_ENABLED else []
+    await outbox.start()
+    publish_queues.start()
+    job_queue.start()
+    # Known before the first request, so retries of these runIds attach to them
+    resuming = asyncio.create_task(resume_jobs(job_queue.restore(unfinished)))
+    try:
+        yield
+    finally:
+        resuming.cancel()
+        await job_queue.stop()
+        await publish_queues.stop()
+        await outbox.stop()
+        await journal.stop()
+        await close_openai_clients()
+        close_media()
+        await close_client()
+        tracing.stop_exporter()
+
 app = FastAPI(
     title="Social Media Publisher",
     description="Auto-publish WordPress content to social media platforms",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 def verify_signature(body: bytes, signature: str) -> bool:
@@ -46,14 +131,16 @@ def verify_signature(body: bytes, signature: str) -> bool:
     
     return hmac.compare_digest(expected_signature, signature)
 
-@app.post("/job")
-async def handle_job(request: Request):
-    """Handle incoming job from WordPress."""
+async def read_signed_json(request: Request, schema: Type[T]) -> T:
+    """Verify the webhook signature, then decode and validate the body in one pass."""
     # Get and verify signature
     signature = request.headers.get("x-ocsp-signature", "")
     body = await request.body()
     
-    if not verify_signature(body, signature):
+    started = time.perf_counter()
+    verified = verify_signature(body, signature)
+    metrics.stage_duration.observe(time.perf_counter() - started, "signature", "")
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid signature"
@@ -61,175 +148,162 @@ async def handle_job(request: Request):
     
     # Parse job data
     try:
-        job: IncomingJob = await request.json()
-    except Exception as e:
+        return decode(body, schema)
+    except ValidationError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid JSON: {e}"
+            detail=str(e)
         )
-    
-    logger.info(f"Processing job {job['runId']} for post {job['post']['id']}")
-    
-    # Generate platform-specific content variants
-    try:
-        variants = await generate_variants(
-            job["post"]["title"],
-            job["post"]["url"],
-            job["post"]["excerpt"],
-            job["post"]["contentHtml"]
-        )
-    except Exception as e:
-        logger.error(f"Content generation failed: {e}")
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"error": f"Content generation failed: {e}"}
-        )
-    
-    # Select or generate image
+
+def read_deadline(request: Request) -> Optional[float]:
+    """Per-job time budget in seconds from the deadline header, if present."""
+    value = request.headers.get(config.JOB_DEADLINE_HEADER)
+    if value is None:
+        return None
     try:
-        media_url = await choose_or_create_image(
-            job["post"]["featuredImage"],
-            variants["imageIdea"]
+        seconds = float(value)
+    except ValueError:
+        seconds = 0
+    if seconds <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {config.JOB_DEADLINE_HEADER} header"
         )
-    except Exception as e:
-        logger.error(f"Image processing failed: {e}")
-        media_url = None
-    
-    # Post to each platform
-    results = {}
+    return seconds
+
+@app.post("/job", status_code=status.HTTP_202_ACCEPTED)
+async def handle_job(request: Request, response: Response):
+    """Accept a job from WordPress and queue it for the worker pool."""
+    job = await read_signed_json(request, IncomingJob)
+    deadline = read_deadline(request)
     
-    # Twitter
-    try:
-        if job["dryRun"]:
-            results["twitter"] = {
-                "status": "skipped",
-                "caption": variants["twitter"]
-            }
-        else:
-            results["twitter"] = await post_to_twitter(
-                variants["twitter"], 
-                media_url
+    with tracing.span(
+        "handle_job",
+        run_id=job["runId"],
+        postId=job["post"]["id"],
+        payloadBytes=len(await request.body())
+    ) as span:
+        # Nobody is waiting for the 202 any more; WordPress will resend
+        if await request.is_disconnected():
+            logger.info(f"Client disconnected before job {job['runId']} was queued")
+            span.set(statusCode=499)
+            return Response(status_code=499)
+        
+        await job_queue.recall([job["runId"]])
+        try:
+            progress, created = job_queue.enqueue(job, deadline=deadline)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e)
             )
-    except Exception as e:
-        logger.error(f"Twitter posting failed: {e}")
-        results["twitter"] = {
-            "status": "failed",
-            "error": str(e)
-        }
+        
+        # Retries of a known runId attach to the existing execution
+        if not created:
+            logger.info(f"Duplicate job {job['runId']} ({progress['state']})")
+            span.set(duplicate=True, state=progress["state"])
+            if progress["state"] == "completed":
+                response.status_code = status.HTTP_200_OK
+                return {"status": "processed", "runId": job["runId"], "results": progress["results"]}
+            return {"status": "accepted", "runId": job["runId"], "duplicate": True}
+        
+        # Journal before acknowledging so the job survives a restart
+        await journal.record_received(job)
     
-    # LinkedIn
-    try:
-        if job["dryRun"]:
-            results["linkedin"] = {
-                "status": "skipped",
-                "caption": variants["linkedin"]
-            }
-        else:
-            results["linkedin"] = await post_to_linkedin(
-                variants["linkedin"], 
-                media_url
-            )
-    except Exception as e:
-        logger.error(f"LinkedIn posting failed: {e}")
-        results["linkedin"] = {
-            "status": "failed",
-            "error": str(e)
-        }
+    logger.info(f"Accepted job {job['runId']} for post {job['post']['id']}")
+    return {"status": "accepted", "runId": job["runId"]}
+
+@app.post("/jobs/batch", status_code=status.HTTP_202_ACCEPTED)
+async def handle_batch(request: Request):
+    """
+    Accept an array of jobs under one signature and queue them on the batch lane.
+    Each job reports back through its own callbackUrl as it finishes.
+    """
+    jobs = await read_signed_json(request, List[IncomingJob])
+    deadline = read_deadline(request)
     
-    # Facebook
-    try:
-        if job["dryRun"]:
-            results["facebook"] = {
-                "status": "skipped",
-                "caption": variants["facebook"]
-            }
-        else:
-            results["facebook"] = await post_to_facebook(
-                variants["facebook"], 
-                media_url
-            )
-    except Exception as e:
-        logger.error(f"Facebook posting failed: {e}")
-        results["facebook"] = {
-            "status": "failed",
-            "error": str(e)
-        }
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a non-empty array of jobs"
+        )
+    if len(jobs) > config.BATCH_MAX_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {config.BATCH_MAX_JOBS} jobs"
+        )
     
-    # Pinterest
+    await job_queue.recall([job["runId"] for job in jobs])
     try:
-        if job["dryRun"]:
-            results["pinterest"] = {
-                "status": "skipped",
-                "caption": variants["pinterest"]["description"]
-            }
-        else:
-            results["pinterest"] = await post_to_pinterest(
-                variants["pinterest"], 
-                media_url
-            )
-    except Exception as e:
-        logger.error(f"Pinterest posting failed: {e}")
-        results["pinterest"] = {
-            "status": "failed",
-            "error": str(e)
-        }
+        queued = job_queue.enqueue_many(jobs, lane="batch", deadline=deadline)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     
-    # Tumblr
-    try:
-        if job["dryRun"]:
-            results["tumblr"] = {
-                "status": "skipped",
-                "caption": variants["tumblr"]["bodyHtml"]
-            }
-        else:
-            results["tumblr"] = await post_to_tumblr(
-                variants["tumblr"], 
-                media_url
-            )
-    except Exception as e:
-        logger.error(f"Tumblr posting failed: {e}")
-        results["tumblr"] = {
-            "status": "failed",
-            "error": str(e)
-        }
+    # Journal every new job in one group commit before acknowledging
+    await asyncio.gather(*(
+        journal.record_received(job)
+        for job, (_, created) in zip(jobs, queued) if created
+    ))
     
-    # Send callback to WordPress
-    callback_payload: CallbackPayload = {
-        "postId": job["post"]["id"],
-        "results": results
+    logger.info(f"Accepted batch of {sum(created for _, created in queued)} new jobs ({len(jobs)} submitted)")
+    return {
+        "status": "accepted",
+        "jobs": [
+            {"runId": progress["runId"], "state": progress["state"], "duplicate": not created}
+            for progress, created in queued
+        ]
     }
-    
-    try:
-        from utils.http import http_request
-        
-        # Sign the callback payload
-        callback_body = JSONResponse(callback_payload).body
-        callback_signature = base64.b64encode(
-            hmac.new(
-                config.WP_WEBHOOK_SECRET.encode(),
-                callback_body,
-                hashlib.sha256
-            ).digest()
-        ).decode()
-        
-        # Send callback
-        response = await http_request(
-            job["callbackUrl"],
-            method="POST",
-            headers={
-                "Content-Type": "application/json",
-                "X-OCSP-Signature": callback_signature
-            },
-            data=callback_body
+
+@app.get("/jobs/{run_id}")
+async def get_job_status(run_id: str):
+    """Report per-stage progress for a job."""
+    progress = job_queue.get_status(run_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
-        
-        if response.status_code >= 400:
-            logger.error(f"Callback failed: {response.status_code} - {response.text}")
-        
-    except Exception as e:
-        logger.error(f"Callback failed: {e}")
-    
-    return {"status": "processed", "results": results}
+    return progress
+
+@app.get("/images/{key}")
+async def get_generated_image(key: str):
+    """Serve a generated image from the local image cache."""
+    path = await asyncio.to_thread(image_cache.path, key) if re.fullmatch(r"[0-9a-f]{64}", key) else None
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    content_type = await image_cache.content_type(key)
+    return FileResponse(path, media_type=content_type)
+
+@app.get("/ratelimits")
+async def get_rate_limits():
+    """Report the rate limiter state for each upstream host."""
+    return rate_limiter.snapshot()
+
+@app.get("/circuits")
+async def get_circuits():
+    """Report the circuit breaker state for each upstream host."""
+    return circuit_breakers.snapshot()
+
+@app.get("/publishers")
+async def get_publishers():
+    """Report queue depth, workers in use and totals for each platform's publish queue."""
+    return publish_queues.stats()
+
+@app.get("/callbacks")
+async def get_callbacks():
+    """Report callback delivery stats for each callbackUrl."""
+    return outbox.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,87 @@
+"""
+Microbenchmark for job decoding and callback encoding with large contentHtml.
+
+Compares the previous path (json parse, twice for request.json(), and
+JSONResponse for callbacks) with utils.codec. Run from the repository root:
+
+    python -m benchmarks.codec [--sizes 10000,100000,1000000] [--repeat 200]
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict
+
+from fastapi.responses import JSONResponse
+
+from typess import IncomingJob, CallbackPayload
+from utils.codec import decode, encode
+
+def make_job(content_chars: int) -> bytes:
+    paragraph = "<p>Lorem ipsum dolor sit amet, “consectetur” adipiscing elit — sed do eiusmod.</p>\n"
+    job = {
+        "runId": "bench-run",
+        "dryRun": False,
+        "ts": "2024-01-01T00:00:00Z",
+        "callbackUrl": "https://example.com/wp-json/ocsp/v1/callback",
+        "post": {
+            "id": 42,
+            "title": "Benchmarking the job decoder",
+            "url": "https://example.com/benchmark",
+            "excerpt": "How fast is it?",
+            "contentHtml": (paragraph * (content_chars // len(paragraph) + 1))[:content_chars],
+            "featuredImage": "https://example.com/image.jpg"
+        }
+    }
+    return json.dumps(job).encode()
+
+def make_callback() -> CallbackPayload:
+    result = {
+        "status": "posted",
+        "caption": "A caption with some length to it, and a link https://example.com/benchmark",
+        "media": ["https://example.com/image.jpg"],
+        "postId": "1234567890",
+        "permalink": "https://example.com/post/1234567890",
+        "error": None
+    }
+    return {"postId": 42, "results": {p: result for p in ("twitter", "linkedin", "facebook", "pinterest", "tumblr")}}
+
+def timeit(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-5 mean seconds per call."""
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+def run(sizes, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for size in sizes:
+        body = make_job(size)
+        results[f"decode {size}"] = {
+            "json x2 (body + request.json)": timeit(lambda: (json.loads(body), json.loads(body)), repeat),
+            "json x1": timeit(lambda: json.loads(body), repeat),
+            "codec.decode (validated)": timeit(lambda: decode(body, IncomingJob), repeat),
+        }
+    payload = make_callback()
+    results["encode callback"] = {
+        "JSONResponse.body": timeit(lambda: JSONResponse(payload).body, repeat * 10),
+        "codec.encode": timeit(lambda: encode(payload), repeat * 10),
+    }
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="contentHtml sizes in characters")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for case, timings in run([int(s) for s in args.sizes.split(",")], args.repeat).items():
+        baseline = next(iter(timings.values()))
+        print(case)
+        for name, seconds in timings.items():
+            print(f"  {name:32} {seconds * 1e6:10.1f} us  {baseline / seconds:5.1f}x")
+
+if __name__ == "__main__":
+    main()
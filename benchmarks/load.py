@@ -0,0 +1,375 @@
+"""
+Load test for the /job endpoint against local upstream stand-ins.
+
+Starts benchmarks.upstreams and the real app:app in their own processes and
+sends signed /job requests at each fixed arrival rate (open loop: requests go
+out on schedule whether or not earlier ones have finished). With --batch N,
+jobs go out instead as signed arrays of N to /jobs/batch, at the same rate
+of jobs per second. Reports
+throughput, end-to-end latency to the WordPress callback, per-stage latency
+percentiles from the app's trace spans, and the app's memory, and writes
+everything to a JSON file for comparison between commits. Run from the
+repository root:
+
+    python -m benchmarks.load [--rates 2,5,10] [--duration 30] [--profile chat=latency:0.8,errors:0.02]
+    python -m benchmarks.load --batch 1000 --rates 1000 --duration 1 --dry-run --env BATCH_CONCURRENCY=64
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.upstreams import parse_profiles
+
+SECRET = "load-test-secret"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def sign(body: bytes) -> str:
+    return base64.b64encode(hmac.new(SECRET.encode(), body, hashlib.sha256).digest()).decode()
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """Count, p50/p95/p99 (nearest rank) and max, in seconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[max(0, math.ceil(p * len(ordered)) - 1)], 4)
+
+    return {"count": len(ordered), "p50": rank(0.5), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1], 4)}
+
+def read_memory(pid: int) -> Dict[str, float]:
+    """Current and peak resident set size of a process in MB (Linux /proc)."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    memory[line[:5]] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return memory
+
+# Stand-in services by path, for naming requests that go to the stand-in's own address
+SERVICE_PATHS = (("/v1/chat/", "chat"), ("/v1/images/", "images"), ("/media/", "media"), ("/callback", "callback"))
+
+def read_spans(pattern: str, upstream_host: str) -> Dict[str, List[float]]:
+    """
+    Span durations by stage: the span name, plus the platform or host where it
+    has one. Requests to the stand-in's own address are named by service.
+    """
+    stages: Dict[str, List[float]] = {}
+    for path in glob.glob(pattern):
+        with open(path, "rb") as spans:
+            for line in spans:
+                span = json.loads(line)
+                attributes = span["attributes"]
+                qualifier = attributes.get("platform") or attributes.get("host")
+                if qualifier == upstream_host:
+                    qualifier = next(
+                        (service for prefix, service in SERVICE_PATHS if attributes.get("path", "/callback").startswith(prefix)),
+                        "upstreams"
+                    )
+                name = f"{span['name']}:{qualifier}" if qualifier and qualifier != span["name"] else span["name"]
+                stages.setdefault(name, []).append(span["duration"])
+                if span["name"] == "run_job":
+                    stages.setdefault("queue_wait", []).append(attributes.get("queueWait", 0.0))
+    return stages
+
+def make_job(run_id: str, post_id: int, args: argparse.Namespace, upstream: str) -> Dict[str, Any]:
+    paragraph = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.</p>\n"
+    featured = random.random() < args.featured
+    return {
+        "runId": run_id,
+        "dryRun": args.dry_run,
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "callbackUrl": f"{upstream}/callback",
+        "post": {
+            "id": post_id,
+            "title": f"Load test post {post_id}",
+            "url": f"https://example.com/posts/{post_id}",
+            "excerpt": "An excerpt for the load test.",
+            "contentHtml": (paragraph * (args.content_chars // len(paragraph) + 1))[:args.content_chars],
+            "featuredImage": f"{upstream}/media/{random.randrange(args.images)}.jpg" if featured else None
+        }
+    }
+
+def app_env(workdir: str, upstream: str, overrides: List[str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    # Placeholder credentials so every publisher makes its calls
+    for name in (
+        "LLM_API_KEY", "IMAGE_API_KEY",
+        "TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_SECRET",
+        "LINKEDIN_ACCESS_TOKEN", "LINKEDIN_USER_ID",
+        "FACEBOOK_PAGE_ACCESS_TOKEN", "FACEBOOK_PAGE_ID",
+        "PINTEREST_ACCESS_TOKEN", "PINTEREST_BOARD_ID",
+        "TUMBLR_CONSUMER_KEY", "TUMBLR_CONSUMER_SECRET", "TUMBLR_OAUTH_TOKEN", "TUMBLR_OAUTH_SECRET",
+    ):
+        env.setdefault(name, "load-test")
+    env.update({
+        "WP_WEBHOOK_SECRET": SECRET,
+        "OPENAI_BASE_URL": f"{upstream}/v1",
+        "JOURNAL_PATH": os.path.join(workdir, "jobs.db"),
+        "IMAGE_CACHE_DIR": os.path.join(workdir, "image-cache"),
+        "TRACE_ENABLED": "true",
+        "TRACE_PATH": os.path.join(workdir, "spans.jsonl"),
+        "TRACE_MAX_BYTES": str(1 << 40),
+        "TRACE_QUEUE_SIZE": "1000000",
+    })
+    for override in overrides:
+        name, _, value = override.partition("=")
+        env[name] = value
+    return env
+
+async def wait_until_up(client: httpx.AsyncClient, url: str, process: subprocess.Popen, log_path: str) -> None:
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}; see {log_path}")
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start; see {log_path}")
+
+def start_process(argv: List[str], log_path: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen([sys.executable, *argv], stdout=log, stderr=subprocess.STDOUT, env=env)
+
+def stop_process(process: subprocess.Popen) -> None:
+    """Shut down gracefully (the app flushes its trace spans on shutdown)."""
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+async def run_rate(rate: float, index: int, args: argparse.Namespace, upstream: str, client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Drive one arrival rate against a fresh app process and summarise it."""
+    workdir = tempfile.mkdtemp(prefix=f"load-{rate}-")
+    port = free_port()
+    log_path = os.path.join(workdir, "app.log")
+    await client.post(f"{upstream}/_reset")
+    app = start_process(
+        ["-m", "benchmarks.load", "--serve", str(port), "--upstream", upstream],
+        log_path,
+        env=app_env(workdir, upstream, args.env)
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_up(client, f"{base_url}/health", app, log_path)
+        memory_before = read_memory(app.pid)
+        samples: List[float] = []
+        submitted: Dict[int, float] = {}
+        responses: Dict[str, int] = {}
+        submit_latency: List[float] = []
+
+        async def submit(first: int, count: int) -> None:
+            """Send jobs first..first+count-1: one /job request, or one /jobs/batch request in batch mode."""
+            post_ids = [(index + 1) * 1_000_000 + i for i in range(first, first + count)]
+            jobs = [make_job(f"load-{index}-{post_id}-{os.getpid()}", post_id, args, upstream) for post_id in post_ids]
+            path, body = ("/jobs/batch", json.dumps(jobs).encode()) if args.batch else ("/job", json.dumps(jobs[0]).encode())
+            sent = time.time()
+            try:
+                response = await client.post(f"{base_url}{path}", content=body, headers={"X-OCSP-Signature": sign(body)})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            submit_latency.append(time.time() - sent)
+            responses[status] = responses.get(status, 0) + 1
+            if status == "202":
+                for post_id in post_ids:
+                    submitted[post_id] = sent
+
+        async def sample_memory() -> None:
+            while True:
+                samples.append(read_memory(app.pid).get("VmRSS", 0.0))
+                await asyncio.sleep(0.5)
+
+        sampler = asyncio.create_task(sample_memory())
+        total = int(rate * args.duration)
+        per_request = args.batch or 1
+        started = time.time()
+        requests = []
+        for i in range(0, total, per_request):
+            delay = started + i / rate - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            requests.append(asyncio.create_task(submit(i, min(per_request, total - i))))
+        await asyncio.gather(*requests)
+        sending_time = time.time() - started
+
+        # Drain: wait for the callback of every accepted job
+        received: Dict[int, Dict[str, Any]] = {}
+        stats: Dict[str, Any] = {"services": {}}
+        drain_until = time.time() + args.drain_timeout
+        while time.time() < drain_until:
+            stats = (await client.get(f"{upstream}/_stats")).json()
+            received = {cb["postId"]: cb for cb in stats["callbacks"] if cb["postId"] in submitted}
+            if len(received) >= len(submitted):
+                break
+            await asyncio.sleep(0.25)
+        sampler.cancel()
+        memory_after = read_memory(app.pid)
+    finally:
+        stop_process(app)
+
+    end_to_end = [received[post_id]["receivedAt"] - submitted[post_id] for post_id in received]
+    finished_at = max((cb["receivedAt"] for cb in received.values()), default=started)
+    publish_results: Dict[str, Dict[str, int]] = {}
+    for cb in received.values():
+        for platform, status in cb["statuses"].items():
+            counts = publish_results.setdefault(platform, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    return {
+        "rate": rate,
+        "batch": args.batch,
+        "duration": args.duration,
+        "sendingTime": round(sending_time, 3),
+        "submitted": total,
+        "responses": responses,
+        "accepted": len(submitted),
+        "completed": len(received),
+        "throughput": round(len(received) / (finished_at - started), 3) if received else 0.0,
+        "latency": {
+            "submit": percentiles(submit_latency),
+            "endToEnd": percentiles(end_to_end)
+        },
+        "stages": {name: percentiles(values) for name, values in sorted(read_spans(os.path.join(workdir, "spans.jsonl*"), httpx.URL(upstream).netloc.decode()).items())},
+        "publishResults": publish_results,
+        "upstreams": stats["services"],
+        "memoryMb": {
+            "rssBefore": round(memory_before.get("VmRSS", 0.0), 1),
+            "rssAfter": round(memory_after.get("VmRSS", 0.0), 1),
+            "rssMax": round(max(samples, default=0.0), 1),
+            "peak": round(memory_after.get("VmHWM", 0.0), 1)
+        },
+        "workdir": workdir
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(run: Dict[str, Any]) -> None:
+    e2e = run["latency"]["endToEnd"]
+    batches = f" in batches of {run['batch']}" if run["batch"] else ""
+    print(
+        f"rate {run['rate']}/s{batches}: {run['completed']}/{run['accepted']} completed, "
+        f"{run['throughput']} jobs/s, end-to-end p50 {e2e.get('p50')}s p99 {e2e.get('p99')}s, "
+        f"peak RSS {run['memoryMb']['peak']} MB"
+    )
+    for name, stage in run["stages"].items():
+        print(f"  {name:48} n={stage['count']:<6} p50 {stage['p50']:8.3f}  p95 {stage['p95']:8.3f}  p99 {stage['p99']:8.3f}")
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    profiles = parse_profiles(args.profile)
+    port = free_port()
+    upstream = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(tempfile.gettempdir(), f"load-upstreams-{port}.log")
+    upstreams = start_process(
+        ["-m", "benchmarks.upstreams", "--port", str(port), *(f"--profile={spec}" for spec in args.profile)],
+        log_path
+    )
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            await wait_until_up(client, f"{upstream}/_stats", upstreams, log_path)
+            runs = []
+            for index, rate in enumerate(args.rates):
+                result = await run_rate(rate, index, args, upstream, client)
+                print_summary(result)
+                runs.append(result)
+    finally:
+        stop_process(upstreams)
+
+    return {
+        "commit": git_commit(),
+        "startedAt": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "rates": args.rates,
+            "duration": args.duration,
+            "batch": args.batch,
+            "featured": args.featured,
+            "images": args.images,
+            "contentChars": args.content_chars,
+            "dryRun": args.dry_run,
+            "env": args.env
+        },
+        "profiles": {name: profile.as_dict() for name, profile in profiles.items()},
+        "runs": runs
+    }
+
+def serve(port: int, upstream: str) -> None:
+    """Run app:app with the upstream API hosts routed to the stand-ins."""
+    import uvicorn
+
+    from benchmarks.upstreams import UpstreamTransport
+    from utils.http import create_transport, init_client
+
+    async def main() -> None:
+        await init_client(UpstreamTransport(upstream, create_transport()))
+        server = uvicorn.Server(uvicorn.Config("app:app", host="127.0.0.1", port=port, log_level="warning"))
+        await server.serve()
+
+    asyncio.run(main())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rates", default="2,5,10", help="Comma-separated job arrival rates, per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of arrivals per rate")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="Seconds to wait for outstanding callbacks")
+    parser.add_argument("--featured", type=float, default=0.8, help="Share of posts with a featured image")
+    parser.add_argument("--images", type=int, default=50, help="Distinct featured images")
+    parser.add_argument("--content-chars", type=int, default=8000, help="contentHtml size")
+    parser.add_argument("--dry-run", action="store_true", help="Send dryRun jobs (no publishing)")
+    parser.add_argument("--batch", type=int, default=0, help="Submit jobs in arrays of this many to /jobs/batch")
+    parser.add_argument("--profile", action="append", default=[], help="Upstream profile, service=field:value,... (repeatable)")
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE setting for the app (repeatable)")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--upstream", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.upstream)
+        return
+
+    args.rates = [float(rate) for rate in args.rates.split(",")]
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        "benchmarks", "results",
+        f"load-{results['commit'] or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as out:
+        json.dump(results, out, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
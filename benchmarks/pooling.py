@@ -0,0 +1,146 @@
+"""
+Per-request latency of outbound calls: a new client per request vs the shared pool.
+
+Before the shared client, http_request opened a new httpx.AsyncClient for
+every attempt, paying a TCP and TLS handshake each time. This sends the same
+callback requests to the upstream stand-in, served over HTTPS with a
+throwaway self-signed certificate, both ways:
+
+- per-request: a fresh client per request, as http_request used to;
+- shared: utils.http.http_request through the app's pooled client.
+
+It reports p50/p95/p99 latency for each and writes them to a JSON file. Run
+from the repository root:
+
+    python -m benchmarks.pooling [--requests 500] [--concurrency 1,10] [--latency 0.005]
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.load import free_port, git_commit, percentiles, start_process, stop_process, wait_until_up
+
+def write_certificate(directory: str) -> Tuple[str, str]:
+    """A self-signed certificate for 127.0.0.1; returns (certfile, keyfile)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(certfile, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return certfile, keyfile
+
+async def measure(send, requests: int, concurrency: int) -> List[float]:
+    """Latency of `requests` calls to send(i), at most `concurrency` at once."""
+    latencies: List[float] = []
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        for i in pending:
+            started = time.perf_counter()
+            await send(i)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from utils.http import close_client, create_transport, http_request, init_client
+
+    workdir = tempfile.mkdtemp(prefix="pooling-")
+    certfile, keyfile = write_certificate(workdir)
+    context = ssl.create_default_context(cafile=certfile)
+    port = free_port()
+    url = f"https://127.0.0.1:{port}/callback"
+    log_path = os.path.join(workdir, "upstreams.log")
+    upstreams = start_process(
+        [
+            "-m", "benchmarks.upstreams", "--port", str(port),
+            f"--profile=callback=latency:{args.latency},jitter:0",
+            "--ssl-certfile", certfile, "--ssl-keyfile", keyfile
+        ],
+        log_path
+    )
+
+    async def per_request(i: int) -> None:
+        async with httpx.AsyncClient(verify=context, timeout=30) as client:
+            response = await client.post(url, json={"postId": i, "results": {}})
+            response.raise_for_status()
+
+    async def shared(i: int) -> None:
+        response = await http_request(url, method="POST", json={"postId": i, "results": {}})
+        response.raise_for_status()
+
+    results: Dict[str, Any] = {}
+    try:
+        async with httpx.AsyncClient(verify=context) as probe:
+            await wait_until_up(probe, f"https://127.0.0.1:{port}/_stats", upstreams, log_path)
+        await init_client(create_transport(verify=context))
+        for concurrency in args.concurrency:
+            for mode, send in (("per-request", per_request), ("shared", shared)):
+                # Warm up (the shared pool opens its connections here)
+                await measure(send, concurrency * 2, concurrency)
+                latencies = await measure(send, args.requests, concurrency)
+                results.setdefault(f"concurrency {concurrency}", {})[mode] = percentiles(latencies)
+    finally:
+        await close_client()
+        stop_process(upstreams)
+
+    return {
+        "commit": git_commit(),
+        "startedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "latency": args.latency},
+        "results": results
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per mode")
+    parser.add_argument("--concurrency", default="1,10", help="Comma-separated numbers of requests in flight")
+    parser.add_argument("--latency", type=float, default=0.005, help="Stand-in service time, in seconds")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/pooling-<commit>-<time>.json)")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+
+    result = asyncio.run(run(args))
+    for setting, modes in result["results"].items():
+        for mode, stats in modes.items():
+            print(f"{setting:16} {mode:12} p50 {stats['p50'] * 1000:7.2f}ms  p95 {stats['p95'] * 1000:7.2f}ms  p99 {stats['p99'] * 1000:7.2f}ms")
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"pooling-{result['commit'] or 'unknown'}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for the upstream APIs, for load tests.
+
+One server plays every upstream: the OpenAI chat and images APIs, an image
+host, Twitter media upload, Facebook, Pinterest, LinkedIn and the WordPress
+callback receiver. Each service has a profile of latency, error and 429 rates.
+Requests the app makes to the real API hosts reach it through
+UpstreamTransport. Run standalone with:
+
+    python -m benchmarks.upstreams --port 9900 [--profile facebook=latency:0.5,throttle:0.1]
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# API hosts the app calls, rewritten to the stand-in by UpstreamTransport
+ROUTED_HOSTS = {
+    "api.twitter.com",
+    "upload.twitter.com",
+    "api.linkedin.com",
+    "graph.facebook.com",
+    "api.pinterest.com",
+    "api.tumblr.com",
+}
+
+class Profile:
+    """
+    How a stand-in service behaves: a log-normal latency with the given median
+    and spread, and the share of requests answered with 500 (errors) or 429
+    (throttle, with Retry-After: retry_after).
+    """
+
+    __slots__ = ("latency", "jitter", "errors", "throttle", "retry_after")
+
+    def __init__(self, latency: float = 0.1, jitter: float = 0.3, errors: float = 0.0, throttle: float = 0.0, retry_after: float = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.errors = errors
+        self.throttle = throttle
+        self.retry_after = retry_after
+
+    def delay(self) -> float:
+        return self.latency * math.exp(random.gauss(0, self.jitter)) if self.latency else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+DEFAULT_PROFILES = {
+    "chat": Profile(latency=1.5),
+    "images": Profile(latency=4.0),
+    "media": Profile(latency=0.02),
+    "facebook": Profile(latency=0.4),
+    "pinterest": Profile(latency=0.5),
+    "linkedin": Profile(latency=0.4),
+    "twitter": Profile(latency=0.3),
+    "callback": Profile(latency=0.05),
+}
+
+def parse_profiles(specs: List[str]) -> Dict[str, Profile]:
+    """
+    Default profiles overridden by specs like "chat=latency:0.8,errors:0.02".
+    Unnamed fields keep their defaults.
+    """
+    profiles = {name: Profile(**profile.as_dict()) for name, profile in DEFAULT_PROFILES.items()}
+    for spec in specs:
+        service, _, fields = spec.partition("=")
+        if service not in profiles:
+            raise ValueError(f"Unknown service {service!r}; expected one of {sorted(profiles)}")
+        for field in filter(None, fields.split(",")):
+            name, _, value = field.partition(":")
+            if name not in Profile.__slots__:
+                raise ValueError(f"Unknown profile field {name!r}; expected one of {list(Profile.__slots__)}")
+            setattr(profiles[service], name, float(value))
+    return profiles
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """Sends requests for ROUTED_HOSTS to the stand-in at base_url; everything else goes through unchanged."""
+
+    def __init__(self, base_url: str, transport: httpx.AsyncBaseTransport):
+        self.base = httpx.URL(base_url)
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host in ROUTED_HOSTS:
+            # The Host header still names the real API
+            request.url = request.url.copy_with(scheme=self.base.scheme, host=self.base.host, port=self.base.port)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+VARIANTS = {
+    "twitter": "A short take on the article, with a link. #news",
+    "linkedin": "A longer, professional summary of the article for LinkedIn readers. " * 3,
+    "facebook": "A friendly summary of the article for Facebook. " * 2,
+    "pinterest": {"title": "Pin title", "description": "A description of the pin. " * 4},
+    "tumblr": {"title": "Tumblr title", "bodyHtml": "<p>A Tumblr post body.</p>" * 3, "tags": ["news", "blog"]},
+    "imageIdea": "An editorial illustration of the article's topic",
+}
+
+profiles: Dict[str, Profile] = parse_profiles([])
+counters: Dict[str, Dict[str, int]] = {}
+callbacks: List[Dict[str, Any]] = []
+_images: Dict[str, bytes] = {}
+_uploads: Dict[str, Dict[str, Any]] = {}
+_assets: Dict[str, int] = {}
+_ids = iter(range(1, 1 << 62))
+
+app = FastAPI(title="Upstream stand-ins")
+
+async def simulate(service: str) -> Optional[Response]:
+    """Wait out the service's latency, then maybe fail the request per its profile."""
+    profile = profiles[service]
+    counts = counters.setdefault(service, {"requests": 0, "errors": 0, "throttled": 0})
+    counts["requests"] += 1
+    await asyncio.sleep(profile.delay())
+    roll = random.random()
+    if roll < profile.throttle:
+        counts["throttled"] += 1
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": str(profile.retry_after)})
+    if roll < profile.throttle + profile.errors:
+        counts["errors"] += 1
+        return JSONResponse({"error": "upstream error"}, status_code=500)
+    return None
+
+def render_image(name: str) -> bytes:
+    """A photo-sized JPEG, distinct per name."""
+    from PIL import Image, ImageDraw
+
+    seed = random.Random(name)
+    image = Image.new("RGB", (1600, 1000), tuple(seed.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = seed.randrange(1600), seed.randrange(1000)
+        draw.ellipse((x, y, x + seed.randrange(50, 400), y + seed.randrange(50, 400)), fill=tuple(seed.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    failed = await simulate("chat")
+    if failed is not None:
+        return failed
+    body = await request.json()
+    content = json.dumps(VARIANTS)
+    articles = body["messages"][-1]["content"].count("### Article")
+    if articles:
+        content = json.dumps({"posts": [VARIANTS] * articles})
+    if not body.get("stream"):
+        return {
+            "id": f"chatcmpl-{next(_ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]
+        }
+
+    async def chunks():
+        for start in range(0, len(content), 16):
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4"),
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 16]}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0.005)
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+@app.post("/v1/images/generations")
+async def image_generations(request: Request):
+    failed = await simulate("images")
+    if failed is not None:
+        return failed
+    return {"created": int(time.time()), "data": [{"url": f"{str(request.base_url).rstrip('/')}/media/generated-{next(_ids)}.jpg"}]}
+
+@app.get("/media/{name}")
+async def media(name: str):
+    failed = await simulate("media")
+    if failed is not None:
+        return failed
+    data = _images.get(name)
+    if data is None:
+        data = _images[name] = await asyncio.to_thread(render_image, name)
+    return Response(data, media_type="image/jpeg")
+
+@app.post("/1.1/media/upload.json")
+async def twitter_upload(request: Request):
+    """
+    Chunked media upload: INIT, APPEND and FINALIZE. GIFs and videos are
+    processed asynchronously, finishing one STATUS poll later.
+    """
+    failed = await simulate("twitter")
+    if failed is not None:
+        return failed
+    form = await request.form()
+    command = form["command"]
+    if command == "INIT":
+        media_id = str(next(_ids))
+        _uploads[media_id] = {"total": int(form["total_bytes"]), "category": form.get("media_category"), "segments": {}}
+        return JSONResponse({"media_id": int(media_id), "media_id_string": media_id, "expires_after_secs": 86400}, status_code=202)
+
+    upload = _uploads.get(form["media_id"])
+    if upload is None:
+        return JSONResponse({"errors": [{"message": "Invalid media_id"}]}, status_code=400)
+    if command == "APPEND":
+        upload["segments"][int(form["segment_index"])] = len(await form["media"].read())
+        return Response(status_code=204)
+    if command == "FINALIZE":
+        received = sum(upload["segments"].values())
+        if received != upload["total"] or sorted(upload["segments"]) != list(range(len(upload["segments"]))):
+            return JSONResponse({"errors": [{"message": f"Received {received} of {upload['total']} bytes"}]}, status_code=400)
+        finalized = {"media_id": int(form["media_id"]), "media_id_string": form["media_id"], "size": received, "expires_after_secs": 86400}
+        if upload["category"] in ("tweet_gif", "tweet_video"):
+            finalized["processing_info"] = {"state": "pending", "check_after_secs": 1}
+        return finalized
+    return JSONResponse({"errors": [{"message": f"Unknown command {command}"}]}, status_code=400)
+
+@app.get("/1.1/media/upload.json")
+async def twitter_upload_status(command: str, media_id: str):
+    failed = await simulate("twitter")
+    if failed is not None:
+        return failed
+    if command != "STATUS" or media_id not in _uploads:
+        return JSONResponse({"errors": [{"message": "Invalid media_id"}]}, status_code=400)
+    return {"media_id": int(media_id), "media_id_string": media_id, "processing_info": {"state": "succeeded", "progress_percent": 100}}
+
+@app.post("/v19.0/")
+async def facebook_batch(request: Request):
+    """Graph batch request: one latency for the batch, errors and throttling per operation."""
+    failed = await simulate("facebook")
+    if failed is not None:
+        return failed
+    profile = profiles["facebook"]
+    results = []
+    for operation in json.loads((await request.form())["batch"]):
+        roll = random.random()
+        if roll < profile.throttle:
+            error = {"message": "Application request limit reached", "code": 4, "is_transient": True}
+            results.append({"code": 400, "body": json.dumps({"error": error})})
+        elif roll < profile.throttle + profile.errors:
+            error = {"message": "An unexpected error has occurred", "code": 2, "is_transient": True}
+            results.append({"code": 500, "body": json.dumps({"error": error})})
+        else:
+            page_id = operation["relative_url"].split("/")[0]
+            results.append({"code": 200, "body": json.dumps({"id": f"{page_id}_{next(_ids)}"})})
+    return results
+
+@app.post("/v19.0/{page_id}/{edge}")
+async def facebook_post(page_id: str, edge: str):
+    failed = await simulate("facebook")
+    if failed is not None:
+        return failed
+    return {"id": f"{page_id}_{next(_ids)}", "post_id": f"{page_id}_{next(_ids)}"}
+
+@app.post("/v5/pins")
+async def pinterest_pin():
+    failed = await simulate("pinterest")
+    if failed is not None:
+        return failed
+    pin_id = str(next(_ids))
+    return JSONResponse({"id": pin_id, "url": f"https://pinterest.com/pin/{pin_id}"}, status_code=201)
+
+@app.post("/v2/assets")
+async def linkedin_register_upload(action: str):
+    failed = await simulate("linkedin")
+    if failed is not None:
+        return failed
+    asset_id = f"C{next(_ids)}"
+    _assets[asset_id] = -1
+    return {
+        "value": {
+            "uploadMechanism": {
+                "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {
+                    "uploadUrl": f"https://api.linkedin.com/mediaUpload/{asset_id}/feedshare-uploadedImage/0",
+                    "headers": {"media-type-family": "STILLIMAGE"}
+                }
+            },
+            "asset": f"urn:li:digitalmediaAsset:{asset_id}"
+        }
+    }
+
+@app.put("/mediaUpload/{asset_id}/{kind}/{index}")
+async def linkedin_upload(asset_id: str, request: Request):
+    failed = await simulate("linkedin")
+    if failed is not None:
+        return failed
+    if asset_id not in _assets:
+        return JSONResponse({"message": "Unknown upload"}, status_code=404)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    _assets[asset_id] = size
+    return Response(status_code=201)
+
+@app.post("/v2/ugcPosts")
+async def linkedin_post(request: Request):
+    """A post, rejected if it references an image that was never uploaded."""
+    failed = await simulate("linkedin")
+    if failed is not None:
+        return failed
+    content = (await request.json())["specificContent"]["com.linkedin.ugc.ShareContent"]
+    for media in content.get("media", []):
+        if _assets.get(media["media"].rpartition(":")[2], -1) <= 0:
+            return JSONResponse({"message": f"Asset {media['media']} has not been uploaded"}, status_code=422)
+    return JSONResponse({"id": f"urn:li:share:{next(_ids)}"}, status_code=201)
+
+@app.post("/callback")
+async def wordpress_callback(request: Request):
+    failed = await simulate("callback")
+    if failed is not None:
+        return failed
+    received_at = time.time()
+    body = json.loads(await request.body())
+    for payload in body if isinstance(body, list) else [body]:
+        callbacks.append({
+            "postId": payload["postId"],
+            "receivedAt": received_at,
+            "statuses": {platform: result["status"] for platform, result in payload["results"].items()}
+        })
+    return {"ok": True}
+
+@app.get("/_stats")
+async def stats():
+    """Request counts per service and the callbacks received so far."""
+    return {"services": counters, "callbacks": callbacks}
+
+@app.post("/_reset")
+async def reset():
+    counters.clear()
+    callbacks.clear()
+    _uploads.clear()
+    _assets.clear()
+    return {"ok": True}
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9900)
+    parser.add_argument("--profile", action="append", default=[], help="service=field:value,... (repeatable)")
+    parser.add_argument("--ssl-certfile", help="Serve HTTPS with this certificate")
+    parser.add_argument("--ssl-keyfile", help="Private key for --ssl-certfile")
+    args = parser.parse_args()
+
+    profiles.update(parse_profiles(args.profile))
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        ssl_certfile=args.ssl_certfile,
+        ssl_keyfile=args.ssl_keyfile,
+        log_level="warning"
+    )
+
+if __name__ == "__main__":
+    main()
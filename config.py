@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +8,7 @@ class Config:
     # Server settings
     PORT = int(os.getenv("PORT", 8080))
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+    DATA_DIR = os.getenv("DATA_DIR", "data")  # Default home of on-disk state, created on first write
     
     # Security
     WP_WEBHOOK_SECRET = os.getenv("WP_WEBHOOK_SECRET")
@@ -16,24 +18,70 @@ class Config:
     LLM_API_KEY = os.getenv("LLM_API_KEY")
     LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4-1106-preview")
     LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))  # Per request, in seconds
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "False").lower() == "true"  # Release variants as they stream in
+    LLM_CONTENT_TOKEN_BUDGET = int(os.getenv("LLM_CONTENT_TOKEN_BUDGET", 1500))  # Article text sent to the LLM
+    LLM_PACK_SIZE = int(os.getenv("LLM_PACK_SIZE", 1))  # Posts per packed request; 1 disables packing
+    LLM_PACK_MAX_TOKENS = int(os.getenv("LLM_PACK_MAX_TOKENS", 400))  # Only posts this small are packed
+    LLM_PACK_WINDOW = float(os.getenv("LLM_PACK_WINDOW", 0.05))  # Seconds to wait for more posts
+    
+    # LLM variant cache
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))  # In seconds
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")  # Empty disables the on-disk tier
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 100 * 1024 * 1024))
     
     # Image Generation
     IMAGE_PROVIDER = os.getenv("IMAGE_PROVIDER", "openai")
     IMAGE_API_KEY = os.getenv("IMAGE_API_KEY")
     IMAGE_MODEL = os.getenv("IMAGE_MODEL", "dall-e-3")
+    IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", 120))  # Per request, in seconds
+    IMAGE_SIZE = os.getenv("IMAGE_SIZE", "1024x1024")
+    IMAGE_QUALITY = os.getenv("IMAGE_QUALITY", "standard")
+    IMAGE_SPECULATION = os.getenv("IMAGE_SPECULATION", "off")  # off | missing | always: generate from the title during the LLM call
+    
+    # Generated image cache, keyed by normalized prompt, model, size and quality
+    IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() == "true"
+    IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 1000))
+    IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", 30 * 24 * 3600))  # In seconds
+    IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(DATA_DIR, "image-cache"))  # Empty keeps records in memory only
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+    IMAGE_URL_TTL = float(os.getenv("IMAGE_URL_TTL", 50 * 60))  # How long provider image URLs stay valid
+    IMAGE_PUBLIC_BASE_URL = os.getenv("IMAGE_PUBLIC_BASE_URL", "")  # Serve cached images at {base}/images/{key}; empty stores no image bytes
+    
+    # Media cache (downloaded images, content-addressed)
+    MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 256 * 1024 * 1024))  # Memory tier
+    MEDIA_CACHE_TTL = float(os.getenv("MEDIA_CACHE_TTL", 24 * 3600))  # In seconds
+    MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "")  # Empty disables the on-disk tier
+    MEDIA_DISK_MAX_BYTES = int(os.getenv("MEDIA_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+    MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", 50 * 1024 * 1024))  # Larger files are rejected
+    MEDIA_TRANSCODE_ENABLED = os.getenv("MEDIA_TRANSCODE_ENABLED", "True").lower() == "true"  # Per-platform renditions
+    MEDIA_TRANSCODE_WORKERS = int(os.getenv("MEDIA_TRANSCODE_WORKERS", 2))  # Processes; 0 = one per CPU
+    MEDIA_RENDITION_PROFILES = json.loads(os.getenv("MEDIA_RENDITION_PROFILES", "{}"))  # {"twitter": {"format": "WEBP"}, ...}
     
     # Social Media API Keys (should use proper secret management in production)
     TWITTER_API_KEY = os.getenv("TWITTER_API_KEY")
     TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
     TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
     TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET")
+    TWITTER_UPLOAD_SEGMENT_BYTES = min(int(os.getenv("TWITTER_UPLOAD_SEGMENT_BYTES", 1024 * 1024)), 5 * 1024 * 1024)  # Media APPEND size (API max 5MB)
+    TWITTER_UPLOAD_CONCURRENCY = int(os.getenv("TWITTER_UPLOAD_CONCURRENCY", 3))  # Concurrent APPENDs per upload
+    TWITTER_PROCESSING_TIMEOUT = float(os.getenv("TWITTER_PROCESSING_TIMEOUT", 120))  # Longest wait for GIF/video processing
+    TWITTER_MEDIA_CACHE_SIZE = int(os.getenv("TWITTER_MEDIA_CACHE_SIZE", 1000))  # Uploaded media ids kept by content hash
     
     LINKEDIN_CLIENT_ID = os.getenv("LINKEDIN_CLIENT_ID")
     LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET")
     LINKEDIN_ACCESS_TOKEN = os.getenv("LINKEDIN_ACCESS_TOKEN")
+    LINKEDIN_USER_ID = os.getenv("LINKEDIN_USER_ID")  # Member id posts are authored as
+    LINKEDIN_ASSET_CACHE_SIZE = int(os.getenv("LINKEDIN_ASSET_CACHE_SIZE", 1000))  # Uploaded image asset URNs kept by content hash
+    LINKEDIN_ASSET_CACHE_TTL = float(os.getenv("LINKEDIN_ASSET_CACHE_TTL", 7 * 24 * 3600))  # In seconds
     
     FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv("FACEBOOK_PAGE_ACCESS_TOKEN")
     FACEBOOK_PAGE_ID = os.getenv("FACEBOOK_PAGE_ID")
+    FACEBOOK_PAGES = json.loads(os.getenv("FACEBOOK_PAGES", "{}"))  # {"page id": "page access token", ...}, posted to as well
+    FACEBOOK_BATCH_SIZE = min(int(os.getenv("FACEBOOK_BATCH_SIZE", 50)), 50)  # Pages per Graph batch request (API max 50)
+    FACEBOOK_BATCH_RETRIES = int(os.getenv("FACEBOOK_BATCH_RETRIES", 2))  # Re-sends of failed transient operations
     
     PINTEREST_ACCESS_TOKEN = os.getenv("PINTEREST_ACCESS_TOKEN")
     PINTEREST_BOARD_ID = os.getenv("PINTEREST_BOARD_ID")
@@ -42,5 +90,75 @@ class Config:
     TUMBLR_CONSUMER_SECRET = os.getenv("TUMBLR_CONSUMER_SECRET")
     TUMBLR_OAUTH_TOKEN = os.getenv("TUMBLR_OAUTH_TOKEN")
     TUMBLR_OAUTH_SECRET = os.getenv("TUMBLR_OAUTH_SECRET")
+    
+    # HTTP client pool
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 10))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "False").lower() == "true"
+    
+    # Rate limiting per upstream host
+    RATE_LIMIT_DEFAULT_RPS = float(os.getenv("RATE_LIMIT_DEFAULT_RPS", 0))  # 0 = only honour upstream headers
+    RATE_LIMIT_DEFAULT_BURST = float(os.getenv("RATE_LIMIT_DEFAULT_BURST", 20))
+    RATE_LIMITS = {  # {"api.pinterest.com": [rps, burst], ...}
+        host: tuple(limits) for host, limits in json.loads(os.getenv("RATE_LIMITS", "{}")).items()
+    }
+    RATE_LIMIT_BACKOFF = float(os.getenv("RATE_LIMIT_BACKOFF", 1))  # 429 without Retry-After, in seconds
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 60))  # Fail instead of waiting longer
+    RATE_LIMIT_MAX_WAITS = int(os.getenv("RATE_LIMIT_MAX_WAITS", 5))  # 429s waited out per request
+    
+    # Circuit breakers per upstream host
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))  # Consecutive failures
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))  # Seconds open before a trial
+    CIRCUIT_HALF_OPEN_MAX = int(os.getenv("CIRCUIT_HALF_OPEN_MAX", 1))  # Trial requests while half-open
+    
+    # Job queue
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 8))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 1000))  # 0 = unbounded
+    JOB_STATUS_MAX_ENTRIES = int(os.getenv("JOB_STATUS_MAX_ENTRIES", 10000))
+    JOB_STATUS_TTL = float(os.getenv("JOB_STATUS_TTL", 3600))  # Finished jobs, in seconds
+    
+    # Job journal (SQLite, WAL mode)
+    JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "True").lower() == "true"
+    JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(DATA_DIR, "jobs.db"))
+    JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", 0.01))  # Group-commit window, in seconds
+    JOURNAL_MAX_BATCH = int(os.getenv("JOURNAL_MAX_BATCH", 500))
+    JOURNAL_RETENTION = int(os.getenv("JOURNAL_RETENTION", 7 * 24 * 3600))  # Finished jobs, in seconds
+    
+    # Batch jobs (/jobs/batch)
+    BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", 1000))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 16))
+    BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", 5000))  # 0 = unbounded
+    
+    # Job deadline, split across stages as shares of the total
+    JOB_DEADLINE = float(os.getenv("JOB_DEADLINE", 300))  # Seconds; overridable per job via JOB_DEADLINE_HEADER
+    JOB_DEADLINE_HEADER = os.getenv("JOB_DEADLINE_HEADER", "x-job-deadline")
+    JOB_DEADLINE_LLM_SHARE = float(os.getenv("JOB_DEADLINE_LLM_SHARE", 0.4))
+    JOB_DEADLINE_IMAGE_SHARE = float(os.getenv("JOB_DEADLINE_IMAGE_SHARE", 0.3))
+    JOB_DEADLINE_PUBLISH_SHARE = float(os.getenv("JOB_DEADLINE_PUBLISH_SHARE", 0.3))
+    
+    # Callback outbox
+    CALLBACK_RETRY_SCHEDULE = os.getenv("CALLBACK_RETRY_SCHEDULE", "1,5,30,120,600,1800")  # Seconds before each retry
+    CALLBACK_COALESCE_MAX = int(os.getenv("CALLBACK_COALESCE_MAX", 1))  # Callbacks per POST; >1 sends JSON arrays
+    CALLBACK_COALESCE_WINDOW = float(os.getenv("CALLBACK_COALESCE_WINDOW", 0.5))  # Seconds to wait for more, if coalescing
+    CALLBACK_CONCURRENCY = int(os.getenv("CALLBACK_CONCURRENCY", 16))  # Destinations sent to at once
+    CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", 30))  # Per attempt, in seconds
+    
+    # Publishing
+    PUBLISH_TIMEOUT = float(os.getenv("PUBLISH_TIMEOUT", 60))  # Per-platform, in seconds
+    PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", 8))  # Workers per platform
+    PUBLISH_QUEUE_SIZE = int(os.getenv("PUBLISH_QUEUE_SIZE", 500))  # Per platform, 0 = unbounded; a full queue defers the post
+    PUBLISH_LIMITS = {  # {"pinterest": [concurrency, queue size], ...}
+        platform: tuple(limits) for platform, limits in json.loads(os.getenv("PUBLISH_LIMITS", "{}")).items()
+    }
+    
+    # Per-job tracing, exported as JSON lines
+    TRACE_ENABLED = os.getenv("TRACE_ENABLED", "False").lower() == "true"
+    TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(DATA_DIR, "traces", "spans.jsonl"))
+    TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 100 * 1024 * 1024))  # Rotate the file at this size
+    TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", 5))  # Rotated files kept
+    TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", 10000))  # Spans waiting to be written; more are dropped
 
 config = Config()
\ No newline at end of file
@@ -1,10 +1,170 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Optional
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 from config import config
+from typess import PostData
+from media import media_cache
+from utils.cache import CacheStats, DiskCache, SingleFlight, TTLCache
 from utils.http import http_request
+from utils.clients import get_openai_client
+from utils.deadline import run_until, timeout_for
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
+# Leading bytes of the image formats platforms accept
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG", b"GIF87a", b"GIF89a")
+
+class GeneratedImageCache(CacheStats):
+    """
+    Cache of generated images keyed on a hash of the normalized prompt, the
+    model, the size and the quality. With `public_base_url` set, the image
+    bytes are kept on disk and served from /images/{key}, so a hit doesn't
+    depend on the provider's short-lived URL. Without it nothing could hand
+    the stored bytes to platforms that fetch by URL, so only the records are
+    kept and the provider URL is reused while it is still valid.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        directory: Optional[str] = None,
+        max_bytes: int = 0,
+        public_base_url: str = ""
+    ):
+        self.memory: TTLCache[Dict[str, Any]] = TTLCache(max_entries, ttl)
+        self.public_base_url = public_base_url
+        self.records = DiskCache(f"{directory}/records", max_bytes, ttl, suffix=".json") if directory else None
+        self.disk = DiskCache(f"{directory}/images", max_bytes, ttl) if directory and public_base_url else None
+        self._generations: SingleFlight[str] = SingleFlight()
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        return re.sub(r"[\s.!]+$", "", " ".join(prompt.lower().split()))
+
+    @classmethod
+    def key(cls, prompt: str) -> str:
+        parts = [cls.normalize(prompt), config.IMAGE_MODEL, config.IMAGE_SIZE, config.IMAGE_QUALITY]
+        return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+    async def generate(self, prompt: str) -> str:
+        """Return an image URL for the prompt, generating the image only on a miss."""
+        key = self.key(prompt)
+        url = await self._lookup(key)
+        if url is not None:
+            self.hits += 1
+            tracing.annotate(cached=True)
+            return url
+
+        if key in self._generations:
+            tracing.annotate(shared=True)
+        else:
+            self.misses += 1
+        return await self._generations.run(key, lambda: self._generate(key, prompt))
+
+    def path(self, key: str) -> Optional[str]:
+        """Local file for a cached image, if it is still stored."""
+        return self.disk.get_path(key) if self.disk is not None else None
+
+    async def content_type(self, key: str) -> str:
+        # The memory tier isn't thread-safe: only the disk read goes to a thread
+        record = self.memory.get(key)
+        if record is None and self.records is not None:
+            data = await asyncio.to_thread(self.records.get, key)
+            record = json.loads(data) if data is not None else None
+        return record["contentType"] if record else "application/octet-stream"
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        record = self.memory.get(key)
+        if record is None and self.records is not None:
+            data = await asyncio.to_thread(self.records.get, key)
+            if data is not None:
+                record = json.loads(data)
+                self.memory.set(key, record)
+        if record is None:
+            return None
+
+        if self.serves_images:
+            if await asyncio.to_thread(self.disk.get_path, key) is None:
+                return None
+            url = self.public_url(key)
+            if media_cache.urls.get(url) is None:
+                # Seed the media cache from disk so publishers don't download the image from us
+                content = await asyncio.to_thread(self.disk.get, key)
+                if content is not None:
+                    await media_cache.put(url, content, record["contentType"])
+            return url
+        if time.time() - record["createdAt"] < config.IMAGE_URL_TTL:
+            return record["url"]
+        return None
+
+    @property
+    def serves_images(self) -> bool:
+        """Whether cached images are handed out as our own /images URLs."""
+        return self.disk is not None
+
+    async def _generate(self, key: str, prompt: str) -> str:
+        url = await generate_openai_image(prompt)
+        try:
+            media = await media_cache.resolve(url)
+        except Exception as e:
+            logger.warning(f"Could not download generated image, not caching it: {e}")
+            return url
+        record = {
+            "prompt": prompt,
+            "url": url,
+            "sha256": media.sha256,
+            "contentType": media.content_type,
+            "createdAt": time.time()
+        }
+        self.memory.set(key, record)
+        if self.records is not None:
+            try:
+                if self.disk is not None:
+                    await asyncio.to_thread(self.disk.set, key, bytes(media.buffer))
+                await asyncio.to_thread(self.records.set, key, json.dumps(record).encode())
+            except OSError as e:
+                logger.warning(f"Generated image cache write failed: {e}")
+                return url
+        if self.serves_images:
+            public_url = self.public_url(key)
+            await media_cache.put(public_url, bytes(media.buffer), media.content_type)
+            return public_url
+        return url
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url.rstrip('/')}/images/{key}"
+
+image_cache = GeneratedImageCache(
+    config.IMAGE_CACHE_MAX_ENTRIES,
+    config.IMAGE_CACHE_TTL,
+    directory=config.IMAGE_CACHE_DIR or None,
+    max_bytes=config.IMAGE_CACHE_MAX_BYTES,
+    public_base_url=config.IMAGE_PUBLIC_BASE_URL
+)
+
+async def generate_openai_image(prompt: str) -> str:
+    """Generate an image with the OpenAI images API and return its URL."""
+    client = get_openai_client(config.IMAGE_API_KEY)
+
+    response = await client.images.generate(
+        model=config.IMAGE_MODEL,
+        prompt=prompt[:1000],  # Truncate very long prompts
+        size=config.IMAGE_SIZE,
+        quality=config.IMAGE_QUALITY,
+        n=1,
+        timeout=timeout_for(config.IMAGE_TIMEOUT)
+    )
+
+    image_url = response.data[0].url
+    logger.info(f"Generated image: {image_url}")
+    return image_url
+
 async def choose_or_create_image(
     featured_image: Optional[str], 
     image_idea: Optional[str] = None
@@ -22,21 +182,10 @@ async def choose_or_create_image(
     if image_idea and config.IMAGE_API_KEY:
         try:
             if config.IMAGE_PROVIDER == "openai":
-                from openai import AsyncOpenAI
-                
-                client = AsyncOpenAI(api_key=config.IMAGE_API_KEY)
-                
-                response = await client.images.generate(
-                    model=config.IMAGE_MODEL,
-                    prompt=image_idea[:1000],  # Truncate very long prompts
-                    size="1024x1024",
-                    quality="standard",
-                    n=1,
-                )
-                
-                image_url = response.data[0].url
-                logger.info(f"Generated image: {image_url}")
-                return image_url
+                with tracing.span("choose_or_create_image", provider="openai", model=config.IMAGE_MODEL):
+                    if config.IMAGE_CACHE_ENABLED:
+                        return await image_cache.generate(image_idea)
+                    return await generate_openai_image(image_idea)
                 
             # Add other image providers here (Stable Diffusion, Midjourney, etc.)
             
@@ -44,4 +193,63 @@ async def choose_or_create_image(
             logger.error(f"Image generation failed: {e}")
     
     # 3. No image available
-    return None
\ No newline at end of file
+    return None
+
+async def validate_image(url: str) -> bool:
+    """Fetch an image into the media cache and check that it really is one."""
+    try:
+        media = await media_cache.resolve(url)
+    except Exception as e:
+        logger.warning(f"Image {url} could not be fetched: {e}")
+        return False
+    head = bytes(media.buffer[:12])
+    if head.startswith(IMAGE_SIGNATURES) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        return True
+    logger.warning(f"Image {url} is not a supported image ({media.content_type})")
+    return False
+
+def speculative_prompt(post: PostData) -> str:
+    """Image prompt built from the post alone, for use before the LLM's imageIdea exists."""
+    return f"Editorial illustration for an article titled \"{post['title']}\". No text in the image."
+
+async def prepare_image(
+    post: PostData,
+    image_idea: Awaitable[Optional[str]],
+    budget: Callable[[], float]
+) -> Optional[str]:
+    """
+    Pick the job's image without waiting on the LLM where possible. The
+    featured image is fetched and validated straight away; `image_idea` is
+    only awaited if an image has to be generated from it.
+
+    `budget()` gives the absolute deadline for image work starting at the
+    time of the call. It's taken once up front for the featured image and
+    speculation, and again once `image_idea` arrives, so time spent waiting
+    on the LLM isn't charged to generating from it.
+
+    IMAGE_SPECULATION controls generating from the title while the LLM runs:
+    "missing" does so for posts without a featured image and uses that image
+    instead of one from imageIdea; "always" also does so for posts with one,
+    as a stand-by in case it fails validation; "off" never speculates.
+    """
+    featured_image = post["featuredImage"]
+    policy = config.IMAGE_SPECULATION
+    speculative = None
+    if config.IMAGE_API_KEY and (policy == "always" or (policy == "missing" and not featured_image)):
+        speculative = asyncio.create_task(choose_or_create_image(None, speculative_prompt(post)))
+    until = budget()
+    try:
+        if featured_image:
+            if await run_until(validate_image(featured_image), until):
+                logger.info(f"Using featured image: {featured_image}")
+                return featured_image
+            logger.warning(f"Featured image {featured_image} is unusable, generating one instead")
+        if speculative is not None:
+            return await run_until(speculative, until)
+        if not config.IMAGE_API_KEY:
+            return None
+        idea = await image_idea
+        return await run_until(choose_or_create_image(None, idea), budget())
+    finally:
+        if speculative is not None and not speculative.done():
+            speculative.cancel()
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+from typess import IncomingJob, JobStatus, JobCheckpoint
+from pipeline import new_job_status, run_job
+from journal import journal
+from utils.cache import TTLCache
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job."""
+
+class JobQueue:
+    """
+    In-process queues drained by fixed pools of async workers.
+
+    Each lane (e.g. "default" for /job, "batch" for /jobs/batch) has its own
+    queue and workers, so a large batch can't starve single jobs.
+
+    Jobs are keyed on runId across all lanes: a repeated runId attaches to the
+    queued or running execution, and a finished one is answered from a bounded,
+    TTL-evicted index, which recall() refills from the journal.
+    """
+
+    def __init__(self, lanes: Dict[str, Tuple[int, int]], max_statuses: int = 10000, status_ttl: float = 3600):
+        # lane -> (worker concurrency, max queue size; 0 = unbounded)
+        self.lanes = lanes
+        self._queues: Dict[str, asyncio.Queue] = {
+            lane: asyncio.Queue(maxsize=max_size) for lane, (_, max_size) in lanes.items()
+        }
+        self._in_flight: Dict[str, JobStatus] = {}
+        self._finished: TTLCache[JobStatus] = TTLCache(max_statuses, status_ttl)
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Spawn the worker tasks for every lane."""
+        if self._workers:
+            return
+        for lane, (concurrency, _) in self.lanes.items():
+            self._workers += [
+                asyncio.create_task(self._worker(lane, i), name=f"job-worker-{lane}-{i}")
+                for i in range(concurrency)
+            ]
+            logger.info(f"Started {concurrency} {lane} job workers")
+
+    def restore(
+        self,
+        unfinished: List[Tuple[IncomingJob, JobCheckpoint]]
+    ) -> List[Tuple[IncomingJob, JobStatus, JobCheckpoint]]:
+        """
+        Register jobs recovered from the journal as queued, skipping any runId
+        already active. Called before requests are served, so a retry that
+        arrives while they are still being queued attaches to the recovered
+        job instead of running it again from scratch. Returns the jobs to pass
+        to resume().
+        """
+        restored = []
+        for job, checkpoint in unfinished:
+            if self._is_active(job["runId"]):
+                continue
+            progress = new_job_status(job)
+            self._in_flight[job["runId"]] = progress
+            restored.append((job, progress, checkpoint))
+        return restored
+
+    async def recall(self, run_ids: List[str]) -> None:
+        """
+        Load jobs that finished but are no longer in the status index (after a
+        restart, or once evicted) back from the journal, so a retry of one is
+        answered with its results instead of publishing again. Call before
+        enqueue().
+        """
+        unknown = [run_id for run_id in run_ids if self.get_status(run_id) is None]
+        for job, stage, results, created_at, updated_at in await journal.load_finished(unknown):
+            if self.get_status(job["runId"]) is not None:
+                continue
+            progress = new_job_status(job)
+            progress.update(state="completed", results=results, acceptedAt=created_at, updatedAt=updated_at)
+            progress["stages"] = {name: "done" for name in progress["stages"]}
+            if stage == "callback_failed":
+                progress["stages"]["callback"] = "failed"
+            self._finished.set(job["runId"], progress)
+
+    async def resume(self, job: IncomingJob, progress: JobStatus, checkpoint: JobCheckpoint) -> None:
+        """Queue a job registered by restore(), waiting for room if needed."""
+        await self._queues["default"].put((job, progress, checkpoint, None, None))
+
+    async def stop(self) -> None:
+        """Cancel the workers. Jobs still queued are dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(
+        self,
+        job: IncomingJob,
+        checkpoint: Optional[JobCheckpoint] = None,
+        lane: str = "default",
+        deadline: Optional[float] = None
+    ) -> Tuple[JobStatus, bool]:
+        """
+        Queue a job and return its progress record, plus whether it was newly queued.
+        A runId that is in flight or already completed is not queued again.
+        `deadline` is the job's time budget in seconds (default JOB_DEADLINE).
+        The current tracing span becomes the parent of the job's run_job span.
+        """
+        existing = self.get_status(job["runId"])
+        if existing is not None and existing["state"] != "failed":
+            return existing, False
+
+        progress = new_job_status(job)
+        try:
+            self._queues[lane].put_nowait((job, progress, checkpoint, deadline, tracing.current()))
+        except asyncio.QueueFull:
+            raise QueueFullError("Job queue is full")
+        self._finished.pop(job["runId"])
+        self._in_flight[job["runId"]] = progress
+        return progress, True
+
+    def enqueue_many(
+        self,
+        jobs: List[IncomingJob],
+        lane: str = "default",
+        deadline: Optional[float] = None
+    ) -> List[Tuple[JobStatus, bool]]:
+        """Queue several jobs, all or nothing: fails without queuing any if they don't fit."""
+        queue = self._queues[lane]
+        new_ids = {job["runId"] for job in jobs if not self._is_active(job["runId"])}
+        if queue.maxsize and queue.qsize() + len(new_ids) > queue.maxsize:
+            raise QueueFullError("Job queue is full")
+        return [self.enqueue(job, lane=lane, deadline=deadline) for job in jobs]
+
+    def get_status(self, run_id: str) -> Optional[JobStatus]:
+        """Return the progress record for a runId, if still retained."""
+        return self._in_flight.get(run_id) or self._finished.get(run_id)
+
+    def depth(self) -> Dict[str, int]:
+        """Number of jobs waiting for a worker, per lane."""
+        return {lane: queue.qsize() for lane, queue in self._queues.items()}
+
+    def count_by_state(self) -> Dict[Tuple[str], int]:
+        """Number of queued and running jobs."""
+        counts = {("queued",): 0, ("running",): 0}
+        for progress in self._in_flight.values():
+            key = (progress["state"],)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def _is_active(self, run_id: str) -> bool:
+        existing = self.get_status(run_id)
+        return existing is not None and existing["state"] != "failed"
+
+    def _finish(self, progress: JobStatus) -> None:
+        """Move a job's record from the in-flight table to the finished index."""
+        self._in_flight.pop(progress["runId"], None)
+        self._finished.set(progress["runId"], progress)
+
+    async def _worker(self, lane: str, index: int) -> None:
+        queue = self._queues[lane]
+        while True:
+            job, progress, checkpoint, deadline, parent = await queue.get()
+            with tracing.span(
+                "run_job",
+                parent=parent,
+                run_id=job["runId"],
+                lane=lane,
+                resumed=checkpoint is not None,
+                queueWait=time.time() - progress["acceptedAt"]
+            ) as span:
+                try:
+                    await run_job(job, progress, checkpoint, deadline)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Job {job['runId']} failed in {lane} worker {index}: {e}")
+                    progress["state"] = "failed"
+                    progress["error"] = progress["error"] or str(e)
+                    # Terminal: a restart shouldn't run it again (a retry of the runId still can)
+                    journal.record_failed(job["runId"])
+                    span.fail(e)
+                finally:
+                    span.set(state=progress["state"])
+                    self._finish(progress)
+                    queue.task_done()
+
+job_queue = JobQueue(
+    lanes={
+        "default": (config.WORKER_CONCURRENCY, config.JOB_QUEUE_SIZE),
+        "batch": (config.BATCH_CONCURRENCY, config.BATCH_QUEUE_SIZE)
+    },
+    max_statuses=config.JOB_STATUS_MAX_ENTRIES,
+    status_ttl=config.JOB_STATUS_TTL
+)
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+from typess import IncomingJob, LLMOutput, Platforms, PublishResult, JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    variants TEXT,
+    media_resolved INTEGER NOT NULL DEFAULT 0,
+    media_url TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    run_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (run_id, platform)
+);
+CREATE INDEX IF NOT EXISTS jobs_done ON jobs (done, updated_at);
+CREATE TABLE IF NOT EXISTS callbacks (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    signature TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+class JobJournal:
+    """
+    Write-ahead journal of job stage transitions in SQLite (WAL mode).
+
+    Writes are queued in memory and committed by a single background task,
+    so many transitions share one transaction (group commit).
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.01, max_batch: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, tuple, Optional[asyncio.Future]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    async def start(self) -> List[Tuple[IncomingJob, JobCheckpoint]]:
+        """Open the journal and return unfinished jobs to resume."""
+        self._conn = await asyncio.to_thread(self._open)
+        unfinished = await asyncio.to_thread(self._load_unfinished)
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop(), name="job-journal")
+        if unfinished:
+            logger.info(f"Resuming {len(unfinished)} unfinished jobs from journal")
+        return unfinished
+
+    async def stop(self) -> None:
+        """Flush outstanding writes and close the database."""
+        if self._writer is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def record_received(self, job: IncomingJob) -> None:
+        """
+        Journal a newly accepted job and wait until it is durable. A retry of
+        a job that failed reopens its row, so it is resumed after a restart.
+        """
+        now = time.time()
+        await self._submit(
+            "INSERT INTO jobs (run_id, job, stage, created_at, updated_at) VALUES (?, ?, 'received', ?, ?) "
+            "ON CONFLICT (run_id) DO UPDATE SET job = excluded.job, stage = 'received', variants = NULL, "
+            "media_resolved = 0, media_url = NULL, done = 0, updated_at = excluded.updated_at "
+            "WHERE jobs.stage = 'failed'",
+            (job["runId"], json.dumps(job), now, now),
+            wait=True
+        )
+
+    def record_variants(self, run_id: str, variants: LLMOutput) -> None:
+        self._submit_nowait(
+            "UPDATE jobs SET stage = 'variants_generated', variants = ?, updated_at = ? WHERE run_id = ?",
+            (json.dumps(variants), time.time(), run_id)
+        )
+
+    def record_media(self, run_id: str, media_url: Optional[str]) -> None:
+        self._submit_nowait(
+            "UPDATE jobs SET stage = 'media_resolved', media_resolved = 1, media_url = ?, updated_at = ? WHERE run_id = ?",
+            (media_url, time.time(), run_id)
+        )
+
+    def record_published(self, run_id: str, platform: Platforms, result: PublishResult) -> None:
+        self._submit_nowait(
+            "INSERT OR REPLACE INTO job_results (run_id, platform, result) VALUES (?, ?, ?)",
+            (run_id, platform, json.dumps(result))
+        )
+
+    async def record_callback_queued(
+        self,
+        callback_id: str,
+        run_id: str,
+        url: str,
+        body: bytes,
+        signature: str,
+        next_attempt_at: float
+    ) -> None:
+        """Journal a callback handed to the outbox and wait until it is durable; the job is then done."""
+        now = time.time()
+        self._submit_nowait(
+            "INSERT OR REPLACE INTO callbacks (id, run_id, url, body, signature, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (callback_id, run_id, url, body, signature, next_attempt_at, now)
+        )
+        await self._submit(
+            "UPDATE jobs SET stage = 'callback_queued', done = 1, updated_at = ? WHERE run_id = ?",
+            (now, run_id),
+            wait=True
+        )
+
+    def record_failed(self, run_id: str) -> None:
+        """Mark a job that failed before its callback was queued as done, so it isn't resumed."""
+        self._submit_nowait(
+            "UPDATE jobs SET stage = 'failed', done = 1, updated_at = ? WHERE run_id = ?",
+            (time.time(), run_id)
+        )
+
+    def record_callback_attempt(self, callback_id: str, attempts: int, next_attempt_at: float) -> None:
+        self._submit_nowait(
+            "UPDATE callbacks SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, next_attempt_at, callback_id)
+        )
+
+    def record_callback(self, run_id: str, delivered: bool, callback_id: Optional[str] = None) -> None:
+        """Record the final outcome of a job's callback, dropping it from the outbox."""
+        if callback_id is not None:
+            self._submit_nowait("DELETE FROM callbacks WHERE id = ?", (callback_id,))
+        self._submit_nowait(
+            "UPDATE jobs SET stage = ?, done = 1, updated_at = ? WHERE run_id = ?",
+            ("callback_delivered" if delivered else "callback_failed", time.time(), run_id)
+        )
+
+    async def load_finished(self, run_ids: List[str]) -> List[Tuple[IncomingJob, str, Dict[str, PublishResult], float, float]]:
+        """
+        Jobs among `run_ids` that finished publishing, as (job, stage, results,
+        created_at, updated_at), so a retry after a restart is answered from
+        the journal instead of posting again. Failed jobs aren't included.
+        """
+        if not self.enabled or not run_ids:
+            return []
+        return await asyncio.to_thread(self._load_finished, run_ids)
+
+    async def load_callbacks(self) -> List[Tuple[str, str, str, bytes, str, int, float]]:
+        """Callbacks still waiting for delivery, oldest first."""
+        if not self.enabled:
+            return []
+        return await asyncio.to_thread(self._load_callbacks)
+
+    def _submit_nowait(self, sql: str, params: tuple) -> None:
+        if not self.enabled:
+            return
+        self._pending.append((sql, params, None))
+        self._schedule()
+
+    async def _submit(self, sql: str, params: tuple, wait: bool = False) -> None:
+        if not self.enabled:
+            return
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.append((sql, params, future))
+        self._schedule()
+        if future is not None:
+            await future
+
+    def _schedule(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Give concurrent jobs a moment to join this transaction
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self._flush()
+            if self._closing:
+                return
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            try:
+                await asyncio.to_thread(self._execute, [(sql, params) for sql, params, _ in batch])
+            except Exception as e:
+                logger.error(f"Journal write failed: {e}")
+                error = e
+            else:
+                error = None
+            for _, _, future in batch:
+                if future is None or future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conn.execute(
+            "DELETE FROM job_results WHERE run_id IN (SELECT run_id FROM jobs WHERE done = 1 AND updated_at < ?)",
+            (time.time() - config.JOURNAL_RETENTION,)
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE done = 1 AND updated_at < ?",
+            (time.time() - config.JOURNAL_RETENTION,)
+        )
+        conn.commit()
+        return conn
+
+    def _execute(self, statements: List[Tuple[str, tuple]]) -> None:
+        with self._conn:
+            for sql, params in statements:
+                self._conn.execute(sql, params)
+
+    def _load_callbacks(self) -> List[Tuple[str, str, str, bytes, str, int, float]]:
+        return self._conn.execute(
+            "SELECT id, run_id, url, body, signature, attempts, next_attempt_at FROM callbacks ORDER BY created_at"
+        ).fetchall()
+
+    def _load_finished(self, run_ids: List[str]) -> List[Tuple[IncomingJob, str, Dict[str, PublishResult], float, float]]:
+        rows = self._conn.execute(
+            f"SELECT run_id, job, stage, created_at, updated_at FROM jobs "
+            f"WHERE run_id IN ({', '.join('?' * len(run_ids))}) AND done = 1 AND stage != 'failed'",
+            run_ids
+        ).fetchall()
+        return [
+            (json.loads(job), stage, self._load_results(run_id), created_at, updated_at)
+            for run_id, job, stage, created_at, updated_at in rows
+        ]
+
+    def _load_results(self, run_id: str) -> Dict[str, PublishResult]:
+        return {
+            platform: json.loads(result)
+            for platform, result in self._conn.execute(
+                "SELECT platform, result FROM job_results WHERE run_id = ?", (run_id,)
+            )
+        }
+
+    def _load_unfinished(self) -> List[Tuple[IncomingJob, JobCheckpoint]]:
+        unfinished = []
+        rows = self._conn.execute(
+            "SELECT run_id, job, variants, media_resolved, media_url FROM jobs WHERE done = 0 ORDER BY created_at"
+        ).fetchall()
+        for run_id, job, variants, media_resolved, media_url in rows:
+            results = self._load_results(run_id)
+            checkpoint = JobCheckpoint(
+                variants=json.loads(variants) if variants else None,
+                mediaResolved=bool(media_resolved),
+                mediaUrl=media_url,
+                results=results
+            )
+            unfinished.append((json.loads(job), checkpoint))
+        return unfinished
+
+journal = JobJournal(
+    config.JOURNAL_PATH,
+    flush_interval=config.JOURNAL_FLUSH_INTERVAL,
+    max_batch=config.JOURNAL_MAX_BATCH
+)
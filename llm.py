@@ -1,28 +1,29 @@
 import json
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
 from typess import LLMOutput
 from config import config
+from utils.cache import CacheStats, DiskCache, TTLCache
+from utils.clients import get_openai_client
+from utils.html import estimate_tokens
+from utils.deadline import timeout_for
+from utils.jsonstream import JSONObjectStream
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
-async def generate_variants(
-    title: str, 
-    url: str, 
-    excerpt: str, 
-    html: str
-) -> LLMOutput:
-    """
-    Generate platform-specific content variants using LLM.
-    """
-    system_prompt = """You format social media copy. Return strict JSON matching this schema:
+FieldCallback = Callable[[str, Any], None]
+
+SYSTEM_PROMPT = """You format social media copy. Return strict JSON matching this schema:
 {
+  "imageIdea": "string (prompt for image generation)",
   "twitter": "string (<= 280 chars, 1-2 relevant hashtags)",
   "linkedin": "string (professional tone, 1-2 sentences + link)",
   "facebook": "string (friendly tone, can be longer)",
   "pinterest": {"title": "string (<= 100 chars)", "description": "string (100-300 chars)"},
-  "tumblr": {"title": "string", "bodyHtml": "string (can include HTML)", "tags": ["string"]},
-  "imageIdea": "string (prompt for image generation)"
+  "tumblr": {"title": "string", "bodyHtml": "string (can include HTML)", "tags": ["string"]}
 }
 
 Rules:
@@ -33,34 +34,186 @@ Rules:
 - Tumblr: Can include HTML formatting, relevant tags
 - Use the provided article URL exactly once per platform
 - Avoid clickbait, maintain authentic voice"""
+
+PACKED_PROMPT_SUFFIX = """
+
+You will receive several articles, each introduced by "### Article <n>".
+Return {"posts": [...]} with one object per article, in the same order, each matching the schema above."""
+
+class VariantCache(CacheStats):
+    """
+    Cache of generated variants keyed on a hash of the normalized post inputs,
+    the model, the temperature and the system prompt. An in-memory LRU tier is
+    backed by an optional on-disk tier that survives restarts.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, directory: Optional[str] = None, max_bytes: int = 0):
+        self.memory: TTLCache[LLMOutput] = TTLCache(max_entries, ttl)
+        self.disk = DiskCache(directory, max_bytes, ttl, suffix=".json") if directory else None
+
+    @staticmethod
+    def key(title: str, url: str, excerpt: str, content: str) -> str:
+        normalized = [" ".join(value.split()) for value in (title, url, excerpt, content)]
+        normalized += [config.LLM_MODEL, str(config.LLM_TEMPERATURE), SYSTEM_PROMPT]
+        return hashlib.sha256("\x00".join(normalized).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[LLMOutput]:
+        variants = self.memory.get(key)
+        if variants is None and self.disk is not None:
+            try:
+                data = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                logger.warning(f"Variant cache read failed: {e}")
+                data = None
+            if data is not None:
+                variants = json.loads(data)
+                self.memory.set(key, variants)
+        if variants is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return variants
+
+    async def set(self, key: str, variants: LLMOutput) -> None:
+        self.memory.set(key, variants)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, json.dumps(variants).encode())
+            except Exception as e:
+                logger.warning(f"Variant cache write failed: {e}")
+
+class VariantPacker:
+    """
+    Coalesces small posts that arrive within a short window into one chat
+    completion, so bulk jobs pay one LLM round-trip per group instead of per post.
+    """
+
+    def __init__(self, max_posts: int, window: float):
+        self.max_posts = max_posts
+        self.window = window
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def generate(self, client, user_content: str) -> Dict[str, Any]:
+        """Queue one post's prompt and wait for its share of the packed completion."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((user_content, future))
+        if len(self._pending) >= self.max_posts:
+            self._flush(client)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush, client)
+        return await future
+
+    def _flush(self, client) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        group, self._pending = self._pending, []
+        if group:
+            task = asyncio.create_task(self._complete_group(client, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _complete_group(self, client, group: List[Tuple[str, asyncio.Future]]) -> None:
+        articles = "\n\n".join(
+            f"### Article {i}\n{user_content}" for i, (user_content, _) in enumerate(group)
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT + PACKED_PROMPT_SUFFIX},
+            {"role": "user", "content": articles}
+        ]
+        try:
+            result = await _complete(client, messages)
+            posts = result["posts"]
+            if len(posts) != len(group):
+                raise ValueError(f"Expected {len(group)} posts, got {len(posts)}")
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), post in zip(group, posts):
+            if not future.done():
+                future.set_result(post)
+
+variant_packer = VariantPacker(config.LLM_PACK_SIZE, config.LLM_PACK_WINDOW)
+
+variant_cache = VariantCache(
+    config.LLM_CACHE_MAX_ENTRIES,
+    config.LLM_CACHE_TTL,
+    directory=config.LLM_CACHE_DIR or None,
+    max_bytes=config.LLM_CACHE_MAX_BYTES
+)
+
+async def generate_variants(
+    title: str, 
+    url: str, 
+    excerpt: str, 
+    content: str,
+    on_field: Optional[FieldCallback] = None
+) -> LLMOutput:
+    """
+    Generate platform-specific content variants using LLM.
+    `content` is the plain-text article body produced by utils.html.extract_text.
+    Identical inputs are served from the variant cache without calling the LLM.
+    
+    If `on_field` is given, it is called once per top-level field (e.g. "twitter",
+    "imageIdea") as soon as that field is available. With LLM_STREAMING enabled this
+    happens while the completion is still being generated.
+    """
+    released = set()
+    
+    def release(variants: Dict[str, Any]) -> None:
+        if on_field is None:
+            return
+        for name, value in variants.items():
+            if name in LLMOutput.__annotations__ and name not in released:
+                released.add(name)
+                on_field(name, value)
+    
+    cache_key = None
+    if config.LLM_CACHE_ENABLED:
+        cache_key = VariantCache.key(title, url, excerpt, content)
+        cached = await variant_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Using cached content variants")
+            tracing.annotate(cached=True)
+            release(cached)
+            return cached
     
     user_content = f"""Article:
 Title: {title}
 URL: {url}
 Excerpt: {excerpt}
-Content: {html[:6000]}  # Truncate very long content"""
+Content:
+{content}"""
 
     try:
         if config.LLM_PROVIDER == "openai":
-            from openai import AsyncOpenAI
-            
-            client = AsyncOpenAI(api_key=config.LLM_API_KEY)
+            client = get_openai_client(config.LLM_API_KEY)
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_content}
+            ]
             
-            response = await client.chat.completions.create(
-                model=config.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=config.LLM_TEMPERATURE,
-                response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            result = json.loads(content)
+            if config.LLM_STREAMING and on_field is not None:
+                tracing.annotate(mode="stream")
+                result = await _stream_completion(client, messages, release)
+            elif config.LLM_PACK_SIZE > 1 and estimate_tokens(content) <= config.LLM_PACK_MAX_TOKENS:
+                tracing.annotate(mode="packed")
+                try:
+                    result = await variant_packer.generate(client, user_content)
+                except Exception as e:
+                    logger.warning(f"Packed LLM request failed, retrying alone: {e}")
+                    tracing.annotate(packError=repr(e))
+                    result = await _complete(client, messages)
+            else:
+                tracing.annotate(mode="single")
+                result = await _complete(client, messages)
             
             # Validate the structure
-            return LLMOutput(
+            variants = LLMOutput(
                 twitter=result["twitter"],
                 linkedin=result["linkedin"],
                 facebook=result["facebook"],
@@ -69,14 +222,58 @@ Content: {html[:6000]}  # Truncate very long content"""
                 imageIdea=result["imageIdea"]
             )
             
+            # Fallback output is never cached, so a later call can still reach the LLM
+            if cache_key is not None:
+                await variant_cache.set(cache_key, variants)
+            release(variants)
+            return variants
+            
         else:
             # Add support for other LLM providers (Anthropic, Cohere, etc.)
             raise ValueError(f"Unsupported LLM provider: {config.LLM_PROVIDER}")
             
     except Exception as e:
         logger.error(f"LLM generation failed: {e}")
-        # Fallback to simple generation
-        return generate_fallback_variants(title, url, excerpt)
+        tracing.annotate(fallback=repr(e))
+        # Fallback to simple generation; fields already streamed out are kept by the caller
+        variants = generate_fallback_variants(title, url, excerpt)
+        release(variants)
+        return variants
+
+async def _complete(client, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Request a JSON completion and return the parsed object."""
+    response = await client.chat.completions.create(
+        model=config.LLM_MODEL,
+        messages=messages,
+        temperature=config.LLM_TEMPERATURE,
+        response_format={"type": "json_object"},
+        timeout=timeout_for(config.LLM_TIMEOUT)
+    )
+    return json.loads(response.choices[0].message.content)
+
+async def _stream_completion(client, messages: List[Dict[str, str]], release: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Stream a JSON completion, releasing each top-level field as soon as it closes."""
+    parser = JSONObjectStream()
+    stream = await client.chat.completions.create(
+        model=config.LLM_MODEL,
+        messages=messages,
+        temperature=config.LLM_TEMPERATURE,
+        response_format={"type": "json_object"},
+        timeout=timeout_for(config.LLM_TIMEOUT),
+        stream=True
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            completed = parser.feed(delta)
+            if completed:
+                release(dict(completed))
+    
+    if not parser.complete:
+        raise ValueError("Streamed completion ended before the JSON object closed")
+    return parser.members
 
 def generate_fallback_variants(title: str, url: str, excerpt: str) -> LLMOutput:
     """Fallback content generation if LLM fails."""
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+
+from config import config
+from typess import RenditionProfile
+from utils.cache import CacheStats, DiskCache, SingleFlight, TTLCache
+from utils.http import http_request
+from utils.imaging import transcode
+
+logger = logging.getLogger(__name__)
+
+# Renditions for platforms sent image bytes (uploads or media fetched through the cache);
+# platforms without one get the source as it is, metadata included
+RENDITION_PROFILES: Dict[str, RenditionProfile] = {
+    "twitter": {"maxWidth": 2048, "maxHeight": 2048, "format": "JPEG", "quality": 85},
+    # LinkedIn rejects images over 36,152,320 pixels, i.e. 6012 x 6012
+    "linkedin": {"maxWidth": 6012, "maxHeight": 6012, "format": "JPEG", "quality": 85},
+    "pinterest": {"maxWidth": 1000, "maxHeight": 1500, "aspect": 2 / 3, "format": "JPEG", "quality": 85},
+}
+for platform, overrides in config.MEDIA_RENDITION_PROFILES.items():
+    RENDITION_PROFILES[platform] = {**RENDITION_PROFILES.get(platform, {}), **overrides}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned rather than forked: the parent has an event loop and threads running
+        _pool = ProcessPoolExecutor(
+            max_workers=config.MEDIA_TRANSCODE_WORKERS or None,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def close_media() -> None:
+    """Shut down the transcoding processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+class MediaTooLargeError(Exception):
+    """Raised when a media file is larger than MEDIA_MAX_BYTES."""
+
+class MediaAsset:
+    """
+    A resolved media file. `buffer` is a read-only view over the cached bytes,
+    or over an mmap of the on-disk copy when `path` is set, so publishers can
+    upload it without copying.
+    """
+
+    __slots__ = ("url", "sha256", "content_type", "buffer", "path", "_source")
+
+    def __init__(
+        self,
+        url: str,
+        sha256: str,
+        content_type: str,
+        source: Union[bytes, mmap.mmap],
+        path: Optional[str] = None
+    ):
+        self.url = url
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.path = path
+        self._source = source
+        self.buffer = memoryview(source).toreadonly()
+
+    @property
+    def size(self) -> int:
+        return self.buffer.nbytes
+
+    def open(self, start: int = 0, end: Optional[int] = None) -> "BufferReader":
+        """A file object over the content (or a slice of it), for clients that want to stream it."""
+        return BufferReader(self.buffer[start:end])
+
+    def chunks(self, chunk_size: int = 64 * 1024) -> "BufferChunks":
+        """The content as a streamed request body."""
+        return BufferChunks(self.buffer, chunk_size)
+
+class BufferReader(io.RawIOBase):
+    """
+    A read-only, seekable file over a buffer. Reads copy only the bytes asked
+    for, so streaming a large media file (or a segment of one) costs one
+    chunk of memory at a time rather than a copy of the whole.
+    """
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self._buffer[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        end = None if size is None or size < 0 else self._position + size
+        chunk = bytes(self._buffer[self._position:end])
+        self._position += len(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._buffer.nbytes}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+class BufferChunks:
+    """
+    A buffer as an async iterable of `chunk_size` pieces, for httpx request
+    bodies. Unlike a generator it can be iterated again, so a retried
+    request sends the content afresh.
+    """
+
+    def __init__(self, buffer: memoryview, chunk_size: int):
+        self._buffer = buffer
+        self._chunk_size = chunk_size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for start in range(0, self._buffer.nbytes, self._chunk_size):
+            yield bytes(self._buffer[start:start + self._chunk_size])
+
+class MediaCache(CacheStats):
+    """
+    Content-addressed cache of downloaded media shared by every publisher.
+
+    URLs map to the sha256 of their content, and the content is stored once
+    per hash: in a memory tier bounded by total bytes, and in an optional
+    on-disk tier read back through mmap.
+
+    Per-platform renditions are stored the same way, under a key derived from
+    the source hash and the profile, so each is transcoded once per source.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        directory: Optional[str] = None,
+        disk_max_bytes: int = 0,
+        max_entries: int = 10000
+    ):
+        self.urls: TTLCache[Tuple[str, str]] = TTLCache(max_entries, ttl)
+        self.memory: TTLCache[bytes] = TTLCache(max_entries, ttl, max_weight=max_bytes, weigh=len)
+        if directory:
+            self.disk = DiskCache(f"{directory}/objects", disk_max_bytes, ttl)
+            self.disk_urls = DiskCache(f"{directory}/urls", disk_max_bytes, ttl, suffix=".json")
+        else:
+            self.disk = self.disk_urls = None
+        # Downloads by URL and transcodes by rendition key
+        self._in_flight: SingleFlight[Any] = SingleFlight()
+
+    async def resolve(self, url: str) -> MediaAsset:
+        """Return the media at `url`, downloading it only if it isn't cached."""
+        asset = await self._lookup(url)
+        if asset is not None:
+            self.hits += 1
+            return asset
+
+        if url not in self._in_flight:
+            self.misses += 1
+        return await self._in_flight.run(url, lambda: self._download(url))
+
+    async def renditions(self, url: str, platforms: Iterable[str]) -> Dict[str, MediaAsset]:
+        """
+        Return the media at `url` prepared for each platform. Missing renditions
+        are produced together from one decode in the transcoding pool. Platforms
+        without a profile, and any rendition that fails, get the source itself.
+        """
+        source = await self.resolve(url)
+        result: Dict[str, MediaAsset] = {}
+        keys: Dict[str, str] = {}
+        missing: Dict[str, RenditionProfile] = {}
+        for platform in platforms:
+            profile = RENDITION_PROFILES.get(platform)
+            if not config.MEDIA_TRANSCODE_ENABLED or not profile:
+                result[platform] = source
+                continue
+            key = keys[platform] = _rendition_key(source.sha256, profile)
+            if key in missing or key in self._in_flight:
+                continue
+            asset = await self._lookup(key, url)
+            if asset is not None:
+                self.hits += 1
+                result[platform] = asset
+            else:
+                self.misses += 1
+                missing[key] = profile
+
+        if missing:
+            self._in_flight.start(missing, self._transcode(source, missing))
+
+        for platform, key in keys.items():
+            if platform in result:
+                continue
+            try:
+                if key in self._in_flight:
+                    result[platform] = (await self._in_flight.wait(key))[key]
+                else:
+                    result[platform] = await self._lookup(key, url) or source
+            except Exception as e:
+                logger.warning(f"Rendition for {platform} of {url} failed, using the source: {e!r}")
+                result[platform] = source
+        return result
+
+    async def rendition(self, url: str, platform: str) -> MediaAsset:
+        """Return the media at `url` prepared for one platform."""
+        return (await self.renditions(url, [platform]))[platform]
+
+    async def put(self, url: str, content: bytes, content_type: str) -> MediaAsset:
+        """Cache content we already have under `url`, so it is never downloaded."""
+        return await self._put(url, url, content, content_type)
+
+    async def _lookup(self, key: str, url: Optional[str] = None) -> Optional[MediaAsset]:
+        """Find the content stored under `key` (a URL or rendition key)."""
+        url = url or key
+        entry = self.urls.get(key)
+        if entry is None and self.disk_urls is not None:
+            data = await asyncio.to_thread(self.disk_urls.get, _url_key(key))
+            if data is not None:
+                record = json.loads(data)
+                entry = (record["sha256"], record["contentType"])
+                self.urls.set(key, entry)
+        if entry is None:
+            return None
+
+        digest, content_type = entry
+        content = self.memory.get(digest)
+        if content is not None:
+            return MediaAsset(url, digest, content_type, content)
+        if self.disk is not None:
+            try:
+                mapped = await asyncio.to_thread(self._map, digest)
+            except OSError as e:
+                logger.warning(f"Media cache read failed for {url}: {e}")
+                mapped = None
+            if mapped is not None:
+                source, path = mapped
+                return MediaAsset(url, digest, content_type, source, path)
+        # The content was evicted; forget the key so it is fetched again
+        self.urls.pop(key)
+        return None
+
+    def _map(self, digest: str) -> Optional[Tuple[Union[bytes, mmap.mmap], str]]:
+        path = self.disk.get_path(digest)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            try:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path
+            except ValueError:
+                # Empty files can't be mapped
+                return f.read(), path
+
+    async def _download(self, url: str) -> MediaAsset:
+        response = await http_request(url, "GET")
+        if response.status_code != 200:
+            raise ValueError(f"Failed to download media {url}: HTTP {response.status_code}")
+        content = response.content
+        if len(content) > config.MEDIA_MAX_BYTES:
+            raise MediaTooLargeError(f"Media {url} is {len(content)} bytes, over {config.MEDIA_MAX_BYTES}")
+        content_type = response.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+        return await self._put(url, url, content, content_type)
+
+    async def _transcode(self, source: MediaAsset, profiles: Dict[str, RenditionProfile]) -> Dict[str, MediaAsset]:
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(_get_pool(), transcode, bytes(source.buffer), profiles)
+        return {
+            key: await self._put(key, source.url, content, content_type)
+            for key, (content, content_type) in rendered.items()
+        }
+
+    async def _put(self, key: str, url: str, content: bytes, content_type: str) -> MediaAsset:
+        """Store content under its hash and point `key` at it."""
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        self.urls.set(key, (digest, content_type))
+        self.memory.set(digest, content)
+        path = None
+        if self.disk is not None:
+            try:
+                path = await asyncio.to_thread(self._store, key, digest, content_type, content)
+            except OSError as e:
+                logger.warning(f"Media cache write failed for {key}: {e}")
+        return MediaAsset(url, digest, content_type, content, path)
+
+    def _store(self, key: str, digest: str, content_type: str, content: bytes) -> str:
+        # Identical content under another key is already on disk
+        path = self.disk.get_path(digest) or self.disk.set(digest, content)
+        record = {"key": key, "sha256": digest, "contentType": content_type}
+        self.disk_urls.set(_url_key(key), json.dumps(record).encode())
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "bytes": self.memory.weight,
+            "pending": len(self._in_flight)
+        }
+
+def _url_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def _rendition_key(digest: str, profile: RenditionProfile) -> str:
+    return f"rendition:{digest}:{json.dumps(profile, sort_keys=True)}"
+
+media_cache = MediaCache(
+    config.MEDIA_CACHE_MAX_BYTES,
+    config.MEDIA_CACHE_TTL,
+    directory=config.MEDIA_CACHE_DIR or None,
+    disk_max_bytes=config.MEDIA_DISK_MAX_BYTES
+)
@@ -0,0 +1,275 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from config import config
+from typess import IncomingJob, Platforms, PublishResult, CallbackPayload
+from journal import journal
+from utils.http import http_request
+from utils.codec import encode
+from utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Client errors that retrying won't fix
+PERMANENT_STATUSES = {400, 401, 403, 404, 405, 410, 413, 422}
+
+def sign(body: bytes) -> str:
+    return base64.b64encode(
+        hmac.new(config.WP_WEBHOOK_SECRET.encode(), body, hashlib.sha256).digest()
+    ).decode()
+
+class OutboxEntry:
+    """One job's signed callback waiting for delivery."""
+
+    __slots__ = ("id", "run_id", "url", "body", "signature", "attempts", "next_attempt_at", "parent")
+
+    def __init__(
+        self,
+        id: str,
+        run_id: str,
+        url: str,
+        body: bytes,
+        signature: str,
+        attempts: int = 0,
+        next_attempt_at: float = 0.0,
+        parent: Optional[tracing.Span] = None
+    ):
+        self.id = id
+        self.run_id = run_id
+        self.url = url
+        self.body = body
+        self.signature = signature
+        self.attempts = attempts
+        self.next_attempt_at = next_attempt_at
+        # The job's span, while in memory; after a restart the callback span starts the runId's trace afresh
+        self.parent = parent
+
+class DestinationStats:
+    """Delivery counters for one callbackUrl."""
+
+    __slots__ = ("queued", "delivered", "failed_attempts", "dropped", "posts", "last_error", "last_delivered_at", "latency")
+
+    def __init__(self):
+        self.queued = 0
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.posts = 0
+        self.last_error: Optional[str] = None
+        self.last_delivered_at: Optional[float] = None
+        self.latency = 0.0
+
+    def snapshot(self, pending: int) -> Dict[str, Any]:
+        return {
+            "pending": pending,
+            "queued": self.queued,
+            "delivered": self.delivered,
+            "failedAttempts": self.failed_attempts,
+            "dropped": self.dropped,
+            "posts": self.posts,
+            "avgLatency": round(self.latency / self.posts, 3) if self.posts else 0.0,
+            "lastError": self.last_error,
+            "lastDeliveredAt": self.last_delivered_at
+        }
+
+class CallbackOutbox:
+    """
+    Durable queue of WordPress callbacks, delivered by a background sender.
+
+    A callback is serialized and signed once when queued and journaled before
+    the job is considered done, so it survives restarts. Each callbackUrl is
+    sent to one POST at a time; callbacks that are due for the same URL are
+    coalesced into a single POST of a JSON array (up to coalesce_max). Failed
+    deliveries are retried on `retry_schedule` (seconds after each attempt)
+    and dropped once it is exhausted or the endpoint rejects them outright.
+    """
+
+    def __init__(self, retry_schedule: List[float], coalesce_max: int = 1, coalesce_window: float = 0.0, concurrency: int = 16):
+        self.retry_schedule = retry_schedule
+        self.coalesce_max = coalesce_max
+        self.coalesce_window = coalesce_window
+        self._limit = asyncio.Semaphore(concurrency)
+        self._entries: Dict[str, List[OutboxEntry]] = {}
+        self._sending: Set[str] = set()
+        self._deliveries: Set[asyncio.Task] = set()
+        self._stats: Dict[str, DestinationStats] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Load undelivered callbacks from the journal and start the sender."""
+        for row in await journal.load_callbacks():
+            self._add(OutboxEntry(*row))
+        if self._entries:
+            logger.info(f"Resuming delivery of {sum(map(len, self._entries.values()))} callbacks")
+        self._wakeup = asyncio.Event()
+        self._sender = asyncio.create_task(self._send_loop(), name="callback-outbox")
+
+    async def stop(self) -> None:
+        """Stop sending. Undelivered callbacks stay in the journal for the next start."""
+        tasks = [task for task in (self._sender, *self._deliveries) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sender = None
+        pending = sum(map(len, self._entries.values()))
+        if pending and not journal.enabled:
+            logger.warning(f"Dropping {pending} undelivered callbacks (journal disabled)")
+
+    async def enqueue(self, job: IncomingJob, results: Dict[Platforms, PublishResult]) -> None:
+        """Sign a job's results and queue them; returns once the callback is durable."""
+        callback_payload: CallbackPayload = {
+            "postId": job["post"]["id"],
+            "results": results
+        }
+        body = encode(callback_payload)
+        entry = OutboxEntry(
+            uuid.uuid4().hex,
+            job["runId"],
+            job["callbackUrl"],
+            body,
+            sign(body),
+            next_attempt_at=time.time() + (self.coalesce_window if self.coalesce_max > 1 else 0.0),
+            parent=tracing.current()
+        )
+        await journal.record_callback_queued(
+            entry.id, entry.run_id, entry.url, entry.body, entry.signature, entry.next_attempt_at
+        )
+        self._add(entry)
+        self._stats_for(entry.url).queued += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            url: stats.snapshot(len(self._entries.get(url, ())))
+            for url, stats in self._stats.items()
+        }
+
+    def _add(self, entry: OutboxEntry) -> None:
+        self._entries.setdefault(entry.url, []).append(entry)
+        self._stats_for(entry.url)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _stats_for(self, url: str) -> DestinationStats:
+        stats = self._stats.get(url)
+        if stats is None:
+            stats = self._stats[url] = DestinationStats()
+        return stats
+
+    async def _send_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            next_due = None
+            for url, entries in self._entries.items():
+                if url in self._sending:
+                    continue
+                due = [entry for entry in entries if entry.next_attempt_at <= now][:self.coalesce_max]
+                if due:
+                    self._sending.add(url)
+                    task = asyncio.create_task(self._deliver(url, due))
+                    self._deliveries.add(task)
+                    task.add_done_callback(self._deliveries.discard)
+                else:
+                    soonest = min(entry.next_attempt_at for entry in entries)
+                    next_due = soonest if next_due is None else min(next_due, soonest)
+            timeout = None if next_due is None else max(0.0, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, url: str, batch: List[OutboxEntry]) -> None:
+        stats = self._stats_for(url)
+        if len(batch) == 1:
+            body, signature = batch[0].body, batch[0].signature
+        else:
+            body = b"[" + b",".join(entry.body for entry in batch) + b"]"
+            signature = sign(body)
+
+        try:
+            async with self._limit:
+                started = time.monotonic()
+                # Coalesced callbacks are traced under the first job; the others are listed in runIds
+                with tracing.span(
+                    "callback",
+                    parent=batch[0].parent,
+                    run_id=batch[0].run_id,
+                    host=urlsplit(url).netloc,
+                    attempt=batch[0].attempts + 1,
+                    payloadBytes=len(body),
+                    runIds=[entry.run_id for entry in batch]
+                ) as span:
+                    try:
+                        response = await http_request(
+                            url,
+                            method="POST",
+                            headers={
+                                "Content-Type": "application/json",
+                                "X-OCSP-Signature": signature
+                            },
+                            data=body,
+                            timeout=config.CALLBACK_TIMEOUT,
+                            max_retries=0
+                        )
+                        error = None if response.status_code < 400 else f"HTTP {response.status_code}"
+                        permanent = response.status_code in PERMANENT_STATUSES
+                        span.set(statusCode=response.status_code)
+                    except Exception as e:
+                        error, permanent = repr(e), False
+                    if error is not None:
+                        span.fail(error)
+                elapsed = time.monotonic() - started
+                stats.posts += 1
+                stats.latency += elapsed
+                metrics.stage_duration.observe(elapsed, "callback", "")
+
+            if error is None:
+                stats.delivered += len(batch)
+                metrics.callbacks.inc("delivered", amount=len(batch))
+                stats.last_delivered_at = time.time()
+                for entry in batch:
+                    self._remove(entry)
+                    journal.record_callback(entry.run_id, True, entry.id)
+                return
+
+            stats.failed_attempts += 1
+            stats.last_error = error
+            for entry in batch:
+                entry.attempts += 1
+                if permanent or entry.attempts > len(self.retry_schedule):
+                    logger.error(f"Giving up on callback for job {entry.run_id} after {entry.attempts} attempts: {error}")
+                    stats.dropped += 1
+                    metrics.callbacks.inc("dropped")
+                    self._remove(entry)
+                    journal.record_callback(entry.run_id, False, entry.id)
+                else:
+                    entry.next_attempt_at = time.time() + self.retry_schedule[entry.attempts - 1]
+                    metrics.callbacks.inc("retried")
+                    journal.record_callback_attempt(entry.id, entry.attempts, entry.next_attempt_at)
+            logger.warning(f"Callback POST to {url} with {len(batch)} results failed: {error}")
+        finally:
+            self._sending.discard(url)
+            self._wakeup.set()
+
+    def _remove(self, entry: OutboxEntry) -> None:
+        entries = self._entries.get(entry.url)
+        if entries is None:
+            return
+        entries.remove(entry)
+        if not entries:
+            del self._entries[entry.url]
+
+outbox = CallbackOutbox(
+    [float(delay) for delay in config.CALLBACK_RETRY_SCHEDULE.split(",") if delay.strip()],
+    coalesce_max=config.CALLBACK_COALESCE_MAX,
+    coalesce_window=config.CALLBACK_COALESCE_WINDOW,
+    concurrency=config.CALLBACK_CONCURRENCY
+)
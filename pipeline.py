@@ -0,0 +1,323 @@
+import logging
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import config
+from typess import IncomingJob, Platforms, LLMOutput, PublishResult, JobStatus, JobStage, StageState, JobCheckpoint
+from llm import generate_variants, generate_fallback_variants
+from images import prepare_image
+from journal import journal
+from outbox import outbox
+from media import media_cache
+from utils.http import circuit_breakers
+from utils.html import extract_text
+from utils.deadline import run_until
+from utils import metrics, tracing
+from publishers import PUBLISHERS
+from publishing import publish_queues, PublishQueueFullError
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("llm", "image", "publish", "callback")
+
+class JobDeadline:
+    """
+    Splits a job's time budget across its stages. Each stage may use its share
+    of the budget from when it starts, but none may run past the whole budget.
+    The callback is delivered by the outbox afterwards and isn't counted.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.work_until = self.started + seconds
+
+    def stage(self, share: float) -> float:
+        """Absolute deadline for a stage starting now."""
+        return min(self.work_until, time.monotonic() + self.seconds * share)
+
+def new_job_status(job: IncomingJob) -> JobStatus:
+    """Create the progress record for a freshly accepted job."""
+    now = time.time()
+    return JobStatus(
+        runId=job["runId"],
+        postId=job["post"]["id"],
+        state="queued",
+        stages={stage: "pending" for stage in STAGES},
+        results=None,
+        error=None,
+        extraction=None,
+        acceptedAt=now,
+        updatedAt=now
+    )
+
+def set_stage(progress: JobStatus, stage: JobStage, state: StageState) -> None:
+    """Record a stage transition on the job's progress record."""
+    progress["stages"][stage] = state
+    progress["updatedAt"] = time.time()
+
+async def publish_to_platform(
+    platform: Platforms,
+    variants: LLMOutput,
+    media_url: Optional[str],
+    dry_run: bool,
+    until: Optional[float] = None
+) -> PublishResult:
+    """
+    Publish to a single platform through its publish queue, never raising and
+    never running past PUBLISH_TIMEOUT or `until` (time.monotonic()),
+    whichever is sooner; time spent queued counts. Posts are deferred as
+    "pending" when the platform's circuit is open or its queue is full.
+    """
+    publisher = PUBLISHERS[platform]
+    variant = variants[platform]
+    started = time.perf_counter()
+
+    try:
+        if dry_run:
+            return {
+                "status": "skipped",
+                "caption": publisher.caption(variant)
+            }
+
+        # Don't start a publish against a host that is known to be down
+        down = next((host for host in publisher.hosts if circuit_breakers.for_host(host).is_open()), None)
+        if down is not None:
+            logger.warning(f"{platform} circuit open for {down}, deferring post")
+            return {
+                "status": "pending",
+                "caption": publisher.caption(variant),
+                "error": f"{platform} is unavailable (circuit open for {down})"
+            }
+
+        publish_until = time.monotonic() + config.PUBLISH_TIMEOUT
+        if until is not None:
+            publish_until = min(publish_until, until)
+        return await run_until(publish_queues.publish(platform, variant, media_url), publish_until)
+    except PublishQueueFullError as e:
+        logger.warning(f"{e}, deferring post")
+        return {
+            "status": "pending",
+            "caption": publisher.caption(variant),
+            "error": str(e)
+        }
+    except asyncio.TimeoutError:
+        logger.error(f"{platform} posting ran out of time")
+        return {
+            "status": "failed",
+            "error": "Timed out"
+        }
+    except Exception as e:
+        logger.error(f"{platform} posting failed: {e}")
+        return {
+            "status": "failed",
+            "error": str(e)
+        }
+    finally:
+        metrics.stage_duration.observe(time.perf_counter() - started, "publish", platform)
+
+async def generate_stage(
+    job: IncomingJob,
+    progress: JobStatus,
+    on_field: Callable[[str, Any], None],
+    until: float
+) -> LLMOutput:
+    """
+    Extract the article text and generate variants, releasing fields through
+    on_field. Falls back to template variants if `until` passes first.
+    """
+    started = time.perf_counter()
+    set_stage(progress, "llm", "running")
+    try:
+        # Strip markup and boilerplate so the prompt budget goes to the article itself
+        content, extraction = extract_text(
+            job["post"]["contentHtml"],
+            config.LLM_CONTENT_TOKEN_BUDGET
+        )
+        progress["extraction"] = extraction
+        logger.info(
+            f"Extracted {extraction['estimatedTokens']} of ~{extraction['rawTokens']} tokens "
+            f"from post {job['post']['id']}"
+        )
+        with tracing.span("generate_variants", contentTokens=extraction["estimatedTokens"]) as span:
+            try:
+                variants = await run_until(generate_variants(
+                    job["post"]["title"],
+                    job["post"]["url"],
+                    job["post"]["excerpt"],
+                    content,
+                    on_field=on_field
+                ), until)
+            except asyncio.TimeoutError:
+                logger.warning(f"Content generation ran out of time for job {job['runId']}, using fallback")
+                span.set(fallback="timeout")
+                variants = generate_fallback_variants(job["post"]["title"], job["post"]["url"], job["post"]["excerpt"])
+                for name, value in variants.items():
+                    on_field(name, value)
+    except Exception as e:
+        logger.error(f"Content generation failed: {e}")
+        set_stage(progress, "llm", "failed")
+        progress["state"] = "failed"
+        progress["error"] = f"Content generation failed: {e}"
+        raise
+    finally:
+        metrics.stage_duration.observe(time.perf_counter() - started, "llm", "")
+    journal.record_variants(job["runId"], variants)
+    set_stage(progress, "llm", "done")
+    return variants
+
+async def image_stage(
+    job: IncomingJob,
+    progress: JobStatus,
+    image_idea: Awaitable[Optional[str]],
+    deadline: JobDeadline
+) -> Optional[str]:
+    """
+    Select or generate the job's image. Runs alongside generation and only
+    waits for `image_idea` if it has to generate from it. The stage's share
+    of the deadline restarts once the idea arrives, so a slow LLM doesn't
+    eat into it. Failures and timeouts leave the job without media.
+    """
+    started = time.perf_counter()
+    set_stage(progress, "image", "running")
+    until = deadline.stage(config.JOB_DEADLINE_IMAGE_SHARE)
+
+    def budget() -> float:
+        nonlocal until
+        until = deadline.stage(config.JOB_DEADLINE_IMAGE_SHARE)
+        return until
+
+    try:
+        with tracing.span("prepare_image", featured=bool(job["post"]["featuredImage"])):
+            # Bounded by the whole job while it waits on the LLM; prepare_image applies the stage's share
+            media_url = await run_until(prepare_image(job["post"], image_idea, budget), deadline.work_until)
+        if media_url:
+            # Fetch and transcode once into the shared media cache so publishers don't each do it
+            try:
+                with tracing.span("renditions"):
+                    await run_until(media_cache.renditions(media_url, PUBLISHERS), until)
+            except Exception as e:
+                logger.warning(f"Media prefetch failed for job {job['runId']}, publishers will fetch it: {e!r}")
+        set_stage(progress, "image", "done")
+    except asyncio.TimeoutError:
+        logger.error(f"Image processing ran out of time for job {job['runId']}")
+        media_url = None
+        set_stage(progress, "image", "failed")
+    except Exception as e:
+        logger.error(f"Image processing failed: {e}")
+        media_url = None
+        set_stage(progress, "image", "failed")
+    metrics.stage_duration.observe(time.perf_counter() - started, "image", "")
+    journal.record_media(job["runId"], media_url)
+    return media_url
+
+async def run_job(
+    job: IncomingJob,
+    progress: JobStatus,
+    checkpoint: Optional[JobCheckpoint] = None,
+    deadline_seconds: Optional[float] = None
+) -> Dict[Platforms, PublishResult]:
+    """
+    Run the full pipeline for one job, recording progress as each stage finishes.
+    When resuming from a journal checkpoint, completed stages are skipped.
+    The job's time budget (deadline_seconds, default JOB_DEADLINE) starts when
+    processing starts and is split across stages by JobDeadline; upstream work
+    still running when its stage's deadline passes is cancelled.
+
+    Stages are chained per field rather than per stage: image work starts with
+    the job (waiting for `imageIdea` only if it must generate from it) and each
+    platform publishes once its own variant and the image are ready. With LLM_STREAMING enabled, fields arrive while the
+    completion is still streaming, so early platforms overlap with generation.
+    """
+    run_id = job["runId"]
+    logger.info(f"Processing job {run_id} for post {job['post']['id']}")
+    progress["state"] = "running"
+    deadline = JobDeadline(deadline_seconds or config.JOB_DEADLINE)
+
+    loop = asyncio.get_running_loop()
+    fields: Dict[str, asyncio.Future] = {name: loop.create_future() for name in LLMOutput.__annotations__}
+
+    def on_field(name: str, value: Any) -> None:
+        future = fields.get(name)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    async def generate() -> LLMOutput:
+        try:
+            return await generate_stage(job, progress, on_field, deadline.stage(config.JOB_DEADLINE_LLM_SHARE))
+        except Exception as e:
+            for future in fields.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark it retrieved: fields nobody ends up waiting on mustn't log it again
+                    future.exception()
+            raise
+
+    async def resolve_media() -> Optional[str]:
+        if checkpoint and checkpoint["mediaResolved"]:
+            set_stage(progress, "image", "done")
+            return checkpoint["mediaUrl"]
+        return await image_stage(job, progress, fields["imageIdea"], deadline)
+
+    async def publish(platform: Platforms) -> PublishResult:
+        variant = await fields[platform]
+        media_url = await media
+        set_stage(progress, "publish", "running")
+        with tracing.span("publish", platform=platform, dryRun=job["dryRun"]) as span:
+            result = await publish_to_platform(
+                platform,
+                {platform: variant},
+                media_url,
+                job["dryRun"],
+                until=deadline.stage(config.JOB_DEADLINE_PUBLISH_SHARE)
+            )
+            span.set(status=result["status"])
+            if result.get("error"):
+                span.fail(result["error"])
+        journal.record_published(run_id, platform, result)
+        metrics.publish_results.inc(platform, result["status"])
+        return result
+
+    # Generate platform-specific content variants
+    if checkpoint and checkpoint["variants"] is not None:
+        generation = None
+        for name, value in checkpoint["variants"].items():
+            on_field(name, value)
+        set_stage(progress, "llm", "done")
+    else:
+        generation = asyncio.create_task(generate())
+    media = asyncio.create_task(resolve_media())
+
+    # Post to the remaining platforms concurrently
+    results = dict(checkpoint["results"]) if checkpoint else {}
+    remaining = [platform for platform in PUBLISHERS if platform not in results]
+    publishes = [asyncio.create_task(publish(platform)) for platform in remaining]
+    try:
+        outcomes = await asyncio.gather(*publishes)
+        await media
+        if generation is not None:
+            await generation
+    except BaseException:
+        # A generation failure reaches every waiting publisher. Stop the rest, publishes
+        # already under way included, so a job reported as failed doesn't keep posting
+        for task in (generation, media, *publishes):
+            if task is None:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
+        raise
+    results.update(zip(remaining, outcomes))
+    results = {platform: results[platform] for platform in PUBLISHERS}
+    progress["results"] = results
+    set_stage(progress, "publish", "done")
+
+    # Queue the callback to WordPress; the outbox delivers it in the background
+    set_stage(progress, "callback", "running")
+    await outbox.enqueue(job, results)
+    set_stage(progress, "callback", "done")
+
+    progress["state"] = "completed"
+    return results
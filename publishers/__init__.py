@@ -0,0 +1,43 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from typess import Platforms, PublishResult
+from publishers.twitter import post_to_twitter
+from publishers.linkedin import post_to_linkedin
+from publishers.facebook import post_to_facebook
+from publishers.pinterest import post_to_pinterest
+from publishers.tumblr import post_to_tumblr
+
+class Publisher:
+    """
+    A platform behind the common publishing interface. `publish` posts the
+    platform's variant with optional media and never needs the rest of the
+    job; `caption` is the text a dry run reports for the variant.
+    """
+
+    def __init__(
+        self,
+        name: Platforms,
+        hosts: Sequence[str],
+        post: Callable[[Any, Optional[str]], Awaitable[PublishResult]],
+        caption: Callable[[Any], str] = lambda variant: variant
+    ):
+        self.name = name
+        self.hosts = tuple(hosts)  # Every API host a post calls, for checking their circuit breakers before publishing
+        self._post = post
+        self.caption = caption
+
+    async def publish(self, variant: Any, media_url: Optional[str] = None) -> PublishResult:
+        return await self._post(variant, media_url)
+
+PUBLISHERS: Dict[Platforms, Publisher] = {}
+
+def register(publisher: Publisher) -> Publisher:
+    """Add a publisher; jobs publish to every registered platform, in registration order."""
+    PUBLISHERS[publisher.name] = publisher
+    return publisher
+
+register(Publisher("twitter", ("api.twitter.com", "upload.twitter.com"), post_to_twitter))
+register(Publisher("linkedin", ("api.linkedin.com",), post_to_linkedin))
+register(Publisher("facebook", ("graph.facebook.com",), post_to_facebook))
+register(Publisher("pinterest", ("api.pinterest.com",), post_to_pinterest, caption=lambda variant: variant["description"]))
+register(Publisher("tumblr", ("api.tumblr.com",), post_to_tumblr, caption=lambda variant: variant["bodyHtml"]))
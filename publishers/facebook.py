@@ -1,64 +1,183 @@
+import asyncio
+import json
 import logging
-from typing import Optional
-from typess import PublishResult
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from typess import PublishResult, TargetResult
 from config import config
 from utils.http import http_request
+from utils import deadline
 
 logger = logging.getLogger(__name__)
 
+GRAPH_URL = "https://graph.facebook.com/v19.0/"
+
+# Graph error codes that are worth retrying: temporary service errors and throttling
+TRANSIENT_ERROR_CODES = {1, 2, 4, 17, 32, 341, 613}
+
+def facebook_pages() -> Dict[str, str]:
+    """Page id -> page access token for every configured page."""
+    pages = dict(config.FACEBOOK_PAGES)
+    if config.FACEBOOK_PAGE_ID and config.FACEBOOK_PAGE_ACCESS_TOKEN:
+        pages.setdefault(config.FACEBOOK_PAGE_ID, config.FACEBOOK_PAGE_ACCESS_TOKEN)
+    return pages
+
+def _operation(page_id: str, access_token: str, caption: str, media_url: Optional[str]) -> Dict[str, str]:
+    """One batch operation posting to a page, authorised with that page's token."""
+    body = {"message": caption, "access_token": access_token}
+    if media_url:
+        # Post with image; Facebook can download from URL
+        edge = "photos"
+        body["url"] = media_url
+    else:
+        # Post without image
+        edge = "feed"
+    return {"method": "POST", "relative_url": f"{page_id}/{edge}", "body": urlencode(body)}
+
+def _failed(error: str) -> TargetResult:
+    return TargetResult(status="failed", postId=None, permalink=None, error=error)
+
+def _parse(item: Optional[Dict[str, Any]]) -> Tuple[TargetResult, bool]:
+    """A batch operation's result, and whether the operation is worth retrying."""
+    if item is None:
+        # Graph didn't get to the operation before the batch timed out
+        return _failed("Facebook API error: operation not completed in batch"), True
+
+    code = item.get("code", 0)
+    try:
+        body = json.loads(item.get("body") or "null")
+    except ValueError:
+        body = None
+    if code == 200 and isinstance(body, dict) and (body.get("id") or body.get("post_id")):
+        post_id = body.get("id") or body.get("post_id")
+        return TargetResult(
+            status="posted",
+            postId=post_id,
+            permalink=f"https://facebook.com/{post_id}",
+            error=None
+        ), False
+
+    error = body.get("error") if isinstance(body, dict) else None
+    transient = code >= 500 or code == 429 or bool(
+        error and (error.get("is_transient") or error.get("code") in TRANSIENT_ERROR_CODES)
+    )
+    return _failed(f"Facebook API error: {code} - {error.get('message') if error else item.get('body')}"), transient
+
+async def _send_batch(
+    page_ids: List[str],
+    pages: Dict[str, str],
+    caption: str,
+    media_url: Optional[str]
+) -> Dict[str, Tuple[TargetResult, bool]]:
+    """Post to up to FACEBOOK_BATCH_SIZE pages in one Graph batch request."""
+    operations = [_operation(page_id, pages[page_id], caption, media_url) for page_id in page_ids]
+    try:
+        response = await http_request(
+            GRAPH_URL,
+            method="POST",
+            data={
+                # The request needs a token of its own; each operation carries its page's
+                "access_token": pages[page_ids[0]],
+                "batch": json.dumps(operations)
+            },
+            # Never re-sent whole: operations that already posted would post again
+            max_retries=0
+        )
+    except Exception as e:
+        # Timeouts, transport errors, 5xx and 429: hand every operation to the per-operation retry
+        return {page_id: (_failed(str(e)), True) for page_id in page_ids}
+
+    if response.status_code != 200:
+        error = f"Facebook API error: {response.status_code} - {response.text}"
+        return {page_id: (_failed(error), False) for page_id in page_ids}
+    items = response.json()
+    items += [None] * (len(page_ids) - len(items))
+    return {page_id: _parse(item) for page_id, item in zip(page_ids, items)}
+
+async def publish_to_pages(
+    pages: Dict[str, str],
+    caption: str,
+    media_url: Optional[str] = None,
+    retry_delay: float = 1.0
+) -> Dict[str, TargetResult]:
+    """
+    Post to every page through Graph batch requests of FACEBOOK_BATCH_SIZE
+    operations, sent concurrently. Operations that fail transiently are
+    re-sent together, up to FACEBOOK_BATCH_RETRIES times with backoff; pages
+    that were posted are never sent again.
+    """
+    results: Dict[str, TargetResult] = {}
+    remaining = list(pages)
+    for attempt in range(config.FACEBOOK_BATCH_RETRIES + 1):
+        batches = [
+            remaining[i:i + config.FACEBOOK_BATCH_SIZE]
+            for i in range(0, len(remaining), config.FACEBOOK_BATCH_SIZE)
+        ]
+        retry = []
+        for outcome in await asyncio.gather(*(_send_batch(batch, pages, caption, media_url) for batch in batches)):
+            for page_id, (result, transient) in outcome.items():
+                results[page_id] = result
+                if transient:
+                    retry.append(page_id)
+        if not retry or attempt == config.FACEBOOK_BATCH_RETRIES:
+            break
+
+        # Keep the results so far rather than retrying past the job's deadline
+        time_left = deadline.remaining()
+        if time_left is not None and time_left <= retry_delay:
+            break
+        logger.warning(f"Retrying {len(retry)} failed Facebook page posts in {retry_delay}s")
+        await asyncio.sleep(retry_delay)
+        retry_delay *= 2
+        remaining = retry
+    return results
+
 async def post_to_facebook(caption: str, media_url: Optional[str] = None) -> PublishResult:
-    """Post content to Facebook."""
-    if not all([config.FACEBOOK_PAGE_ACCESS_TOKEN, config.FACEBOOK_PAGE_ID]):
+    """Post content to every configured Facebook page."""
+    pages = facebook_pages()
+    if not pages:
         return PublishResult(
             status="failed",
             error="Facebook API credentials not configured"
         )
-    
+
     try:
-        if media_url:
-            # Post with image
-            url = f"https://graph.facebook.com/v19.0/{config.FACEBOOK_PAGE_ID}/photos"
-            data = {
-                "message": caption,
-                "url": media_url,  # Facebook can download from URL
-                "access_token": config.FACEBOOK_PAGE_ACCESS_TOKEN
-            }
+        targets = await publish_to_pages(pages, caption, media_url)
+        posted = [result for result in targets.values() if result["status"] == "posted"]
+        failed = {page_id: result["error"] for page_id, result in targets.items() if result["status"] != "posted"}
+
+        error_msg = None
+        if failed:
+            if len(targets) == 1:
+                error_msg = next(iter(failed.values()))
+            else:
+                error_msg = f"{len(failed)} of {len(targets)} pages failed: " + "; ".join(
+                    f"{page_id}: {error}" for page_id, error in failed.items()
+                )
+            logger.error(error_msg)
+
+        if not posted:
+            result = PublishResult(
+                status="failed",
+                error=error_msg
+            )
         else:
-            # Post without image
-            url = f"https://graph.facebook.com/v19.0/{config.FACEBOOK_PAGE_ID}/feed"
-            data = {
-                "message": caption,
-                "access_token": config.FACEBOOK_PAGE_ACCESS_TOKEN
-            }
-        
-        response = await http_request(
-            url,
-            method="POST",
-            data=data
-        )
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            post_id = response_data.get("id") or response_data.get("post_id")
-            
-            return PublishResult(
+            result = PublishResult(
                 status="posted",
                 caption=caption,
                 media=[media_url] if media_url else None,
-                postId=post_id,
-                permalink=f"https://facebook.com/{post_id}"
-            )
-        else:
-            error_msg = f"Facebook API error: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            return PublishResult(
-                status="failed",
+                postId=posted[0]["postId"],
+                permalink=posted[0]["permalink"],
                 error=error_msg
             )
-            
+        # Per-page results only when posting to several, so single-page callbacks keep their shape
+        if len(targets) > 1:
+            result["targets"] = targets
+        return result
+
     except Exception as e:
         logger.error(f"Facebook posting failed: {e}")
         return PublishResult(
             status="failed",
             error=str(e)
-        )
\ No newline at end of file
+        )
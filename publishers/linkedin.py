@@ -1,49 +1,126 @@
 import logging
-from typing import Optional
+from typing import Dict, Optional
 from typess import PublishResult
 from config import config
+from media import MediaAsset, media_cache
+from utils.cache import SingleFlight, TTLCache
 from utils.http import http_request
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
+REGISTER_UPLOAD_URL = "https://api.linkedin.com/v2/assets?action=registerUpload"
+UPLOAD_MECHANISM = "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"
+
+class LinkedInUploadError(Exception):
+    """Raised when LinkedIn rejects an image upload."""
+
+# Image content hash -> digital media asset URN
+_assets: TTLCache[str] = TTLCache(config.LINKEDIN_ASSET_CACHE_SIZE, config.LINKEDIN_ASSET_CACHE_TTL)
+# Uploads in progress, by content hash
+_uploads: SingleFlight[str] = SingleFlight()
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {config.LINKEDIN_ACCESS_TOKEN}",
+        "X-Restli-Protocol-Version": "2.0.0"
+    }
+
+async def _upload(media: MediaAsset) -> str:
+    """Register an image upload, then stream the bytes to the URL LinkedIn hands back."""
+    with tracing.span("linkedin_upload", bytes=media.size):
+        response = await http_request(
+            REGISTER_UPLOAD_URL,
+            method="POST",
+            headers=_headers(),
+            json={
+                "registerUploadRequest": {
+                    "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
+                    "owner": f"urn:li:person:{config.LINKEDIN_USER_ID}",
+                    "serviceRelationships": [{
+                        "relationshipType": "OWNER",
+                        "identifier": "urn:li:userGeneratedContent"
+                    }]
+                }
+            }
+        )
+        if response.status_code >= 400:
+            raise LinkedInUploadError(f"LinkedIn registerUpload failed: {response.status_code} - {response.text}")
+        registered = response.json()["value"]
+        upload = registered["uploadMechanism"][UPLOAD_MECHANISM]
+
+        # Streamed from the shared media buffer; the body is never copied whole
+        response = await http_request(
+            upload["uploadUrl"],
+            method="PUT",
+            headers={
+                **_headers(),
+                **upload.get("headers", {}),
+                "Content-Type": media.content_type,
+                "Content-Length": str(media.size)
+            },
+            content=media.chunks()
+        )
+        if response.status_code >= 400:
+            raise LinkedInUploadError(f"LinkedIn image upload failed: {response.status_code} - {response.text}")
+
+    _assets.set(media.sha256, registered["asset"])
+    return registered["asset"]
+
+async def upload_image(media: MediaAsset) -> str:
+    """
+    Return the asset URN of the image on LinkedIn, uploading it only if the
+    same bytes haven't been uploaded already.
+    """
+    asset = _assets.get(media.sha256)
+    if asset is not None:
+        tracing.annotate(mediaCached=True)
+        return asset
+
+    return await _uploads.run(media.sha256, lambda: _upload(media))
+
+async def upload_media_to_linkedin(media_url: str) -> Optional[str]:
+    """Upload the image at `media_url` to LinkedIn and return its asset URN."""
+    try:
+        # The image from the shared media cache, downloaded once for every platform
+        media = await media_cache.rendition(media_url, "linkedin")
+        return await upload_image(media)
+    except Exception as e:
+        logger.error(f"LinkedIn image upload failed: {e}")
+        return None
+
 async def post_to_linkedin(caption: str, media_url: Optional[str] = None) -> PublishResult:
     """Post content to LinkedIn."""
-    if not config.LINKEDIN_ACCESS_TOKEN:
+    if not config.LINKEDIN_ACCESS_TOKEN or not config.LINKEDIN_USER_ID:
         return PublishResult(
             status="failed",
-            error="LinkedIn access token not configured"
+            error="LinkedIn access token or user id not configured"
         )
     
     try:
-        # LinkedIn API requires a specific format for UGC posts
-        # This is a simplified example
-        
-        headers = {
-            "Authorization": f"Bearer {config.LINKEDIN_ACCESS_TOKEN}",
-            "Content-Type": "application/json",
-            "X-Restli-Protocol-Version": "2.0.0"
-        }
+        # Images are uploaded first and referenced by asset URN; without one the post goes out as text
+        asset = await upload_media_to_linkedin(media_url) if media_url else None
         
         # Prepare the post content
         post_data = {
-            "author": f"urn:li:person:{config.LINKEDIN_USER_ID}",  # Would need to be configured
+            "author": f"urn:li:person:{config.LINKEDIN_USER_ID}",
             "lifecycleState": "PUBLISHED",
             "specificContent": {
                 "com.linkedin.ugc.ShareContent": {
                     "shareCommentary": {
                         "text": caption
                     },
-                    "shareMediaCategory": "NONE" if not media_url else "IMAGE",
+                    "shareMediaCategory": "IMAGE" if asset else "NONE",
                     "media": [{
                         "status": "READY",
                         "description": {
                             "text": caption[:200]  # Truncated description
                         },
-                        "media": media_url,
+                        "media": asset,
                         "title": {
                             "text": "Post Image"
                         }
-                    }] if media_url else []
+                    }] if asset else []
                 }
             },
             "visibility": {
@@ -55,7 +132,7 @@ async def post_to_linkedin(caption: str, media_url: Optional[str] = None) -> Pub
         response = await http_request(
             "https://api.linkedin.com/v2/ugcPosts",
             method="POST",
-            headers=headers,
+            headers=_headers(),
             json=post_data
         )
         
@@ -66,7 +143,7 @@ async def post_to_linkedin(caption: str, media_url: Optional[str] = None) -> Pub
             return PublishResult(
                 status="posted",
                 caption=caption,
-                media=[media_url] if media_url else None,
+                media=[media_url] if asset else None,
                 postId=post_id,
                 permalink=f"https://www.linkedin.com/feed/update/{post_id}"
             )
@@ -77,10 +154,10 @@ async def post_to_linkedin(caption: str, media_url: Optional[str] = None) -> Pub
                 status="failed",
                 error=error_msg
             )
-            
+    
     except Exception as e:
         logger.error(f"LinkedIn posting failed: {e}")
         return PublishResult(
             status="failed",
             error=str(e)
-        )
\ No newline at end of file
+        )
@@ -1,8 +1,10 @@
 import logging
+import base64
 from typing import Optional
 from typess import PublishResult, PinterestVariant
 from config import config
 from utils.http import http_request
+from media import media_cache
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,20 @@ async def post_to_pinterest(variant: PinterestVariant, media_url: Optional[str]
             }
         }
         
+        # Upload the cropped rendition when there is one; otherwise let Pinterest fetch the URL
+        try:
+            source = await media_cache.resolve(media_url)
+            media = await media_cache.rendition(media_url, "pinterest")
+        except Exception as e:
+            logger.warning(f"Pinterest rendition unavailable, sending the image URL: {e}")
+            source = media = None
+        if media is not None and media.sha256 != source.sha256:
+            pin_data["media_source"] = {
+                "source_type": "image_base64",
+                "content_type": media.content_type,
+                "data": base64.b64encode(media.buffer).decode()
+            }
+        
         response = await http_request(
             "https://api.pinterest.com/v5/pins",
             method="POST",
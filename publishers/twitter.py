@@ -1,11 +1,140 @@
+import asyncio
 import logging
-from typing import List, Optional
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+import httpx
 from typess import PublishResult
 from config import config
-from utils.http import http_request
+from media import MediaAsset, media_cache
+from utils.cache import SingleFlight, TTLCache
+from utils.http import OAuth1Auth, http_request
+from utils import deadline, tracing
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_URL = "https://upload.twitter.com/1.1/media/upload.json"
+
+# Uploaded media expires (after 24h unless FINALIZE says otherwise); stop reusing an id this long before
+MEDIA_ID_EXPIRY_MARGIN = 600
+
+class TwitterUploadError(Exception):
+    """Raised when Twitter rejects a media upload or fails to process it."""
+
+# Content hash -> (media id, monotonic time it stops being reused)
+_media_ids: TTLCache[Tuple[str, float]] = TTLCache(config.TWITTER_MEDIA_CACHE_SIZE, 24 * 60 * 60)
+# Uploads in progress, by content hash
+_uploads: SingleFlight[str] = SingleFlight()
+
+def _auth() -> OAuth1Auth:
+    return OAuth1Auth(
+        config.TWITTER_API_KEY, config.TWITTER_API_SECRET,
+        config.TWITTER_ACCESS_TOKEN, config.TWITTER_ACCESS_SECRET
+    )
+
+def _media_category(content_type: str) -> str:
+    if content_type == "image/gif":
+        return "tweet_gif"
+    if content_type.startswith("video/"):
+        return "tweet_video"
+    return "tweet_image"
+
+def _checked(response: httpx.Response, command: str) -> Dict[str, Any]:
+    if response.status_code >= 400:
+        raise TwitterUploadError(f"Twitter media {command} failed: {response.status_code} - {response.text}")
+    return response.json() if response.content else {}
+
+async def _append(media_id: str, media: MediaAsset, index: int) -> None:
+    """Send one segment, streamed from the media buffer rather than copied out of it."""
+    start = index * config.TWITTER_UPLOAD_SEGMENT_BYTES
+    segment = media.open(start, start + config.TWITTER_UPLOAD_SEGMENT_BYTES)
+    response = await http_request(
+        UPLOAD_URL,
+        method="POST",
+        data={"command": "APPEND", "media_id": media_id, "segment_index": str(index)},
+        files={"media": ("media", segment, "application/octet-stream")},
+        auth=_auth()
+    )
+    _checked(response, "APPEND")
+
+async def _wait_for_processing(media_id: str, info: Optional[Dict[str, Any]]) -> None:
+    """Poll STATUS until asynchronous (GIF/video) processing finishes."""
+    started = time.monotonic()
+    while info and info.get("state") in ("pending", "in_progress"):
+        wait = info.get("check_after_secs", 1)
+        time_left = deadline.remaining()
+        if (time_left is not None and time_left <= wait) or time.monotonic() - started + wait > config.TWITTER_PROCESSING_TIMEOUT:
+            raise TwitterUploadError(f"Twitter media {media_id} still processing after {time.monotonic() - started:.1f}s")
+        await asyncio.sleep(wait)
+        response = await http_request(f"{UPLOAD_URL}?{urlencode({'command': 'STATUS', 'media_id': media_id})}", auth=_auth())
+        info = _checked(response, "STATUS").get("processing_info")
+    if info and info.get("state") == "failed":
+        raise TwitterUploadError(f"Twitter media processing failed: {(info.get('error') or {}).get('message', 'unknown error')}")
+
+async def _upload(media: MediaAsset) -> str:
+    """
+    Chunked upload: INIT, then APPENDs of TWITTER_UPLOAD_SEGMENT_BYTES with at
+    most TWITTER_UPLOAD_CONCURRENCY in flight, then FINALIZE and any STATUS
+    polling. Each APPEND streams its segment, so memory stays bounded however
+    large the media is.
+    """
+    started = time.monotonic()
+    category = _media_category(media.content_type)
+    segments = math.ceil(media.size / config.TWITTER_UPLOAD_SEGMENT_BYTES)
+    with tracing.span("twitter_upload", bytes=media.size, segments=segments, category=category):
+        response = await http_request(
+            UPLOAD_URL,
+            method="POST",
+            data={
+                "command": "INIT",
+                "total_bytes": str(media.size),
+                "media_type": media.content_type,
+                "media_category": category
+            },
+            auth=_auth()
+        )
+        media_id = _checked(response, "INIT")["media_id_string"]
+
+        pending = iter(range(segments))
+
+        async def append_segments() -> None:
+            for index in pending:
+                await _append(media_id, media, index)
+
+        workers = [asyncio.create_task(append_segments()) for _ in range(min(config.TWITTER_UPLOAD_CONCURRENCY, segments))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # One failed segment fails the upload; don't leave the others sending
+            for worker in workers:
+                worker.cancel()
+
+        response = await http_request(
+            UPLOAD_URL,
+            method="POST",
+            data={"command": "FINALIZE", "media_id": media_id},
+            auth=_auth()
+        )
+        finalized = _checked(response, "FINALIZE")
+        await _wait_for_processing(media_id, finalized.get("processing_info"))
+
+    expires_after = finalized.get("expires_after_secs", 24 * 60 * 60)
+    _media_ids.set(media.sha256, (media_id, started + expires_after - MEDIA_ID_EXPIRY_MARGIN))
+    return media_id
+
+async def upload_media(media: MediaAsset) -> str:
+    """
+    Return a Twitter media id for the content, uploading it only if the same
+    bytes haven't been uploaded while their media id is still valid.
+    """
+    cached = _media_ids.get(media.sha256)
+    if cached is not None and cached[1] > time.monotonic():
+        tracing.annotate(mediaCached=True)
+        return cached[0]
+
+    return await _uploads.run(media.sha256, lambda: _upload(media))
+
 async def upload_media_to_twitter(media_url: str) -> Optional[str]:
     """Upload media to Twitter and return media_id."""
     if not all([config.TWITTER_API_KEY, config.TWITTER_API_SECRET, 
@@ -14,24 +143,9 @@ async def upload_media_to_twitter(media_url: str) -> Optional[str]:
         return None
     
     try:
-        # In a real implementation, you would use the Twitter API v2
-        # with proper OAuth 1.0a authentication to upload media
-        # This is a simplified example
-        
-        # Step 1: Download the image
-        response = await http_request(media_url, "GET")
-        if response.status_code != 200:
-            logger.error(f"Failed to download image: {response.status_code}")
-            return None
-            
-        media_data = response.content
-        
-        # Step 2: Upload to Twitter (pseudo-code)
-        # media_id = twitter_api.media_upload(media_data)
-        # return media_id
-        
-        logger.warning("Twitter media upload not fully implemented")
-        return "dummy_media_id"
+        # Get the image, sized for Twitter, from the shared media cache
+        media = await media_cache.rendition(media_url, "twitter")
+        return await upload_media(media)
         
     except Exception as e:
         logger.error(f"Twitter media upload failed: {e}")
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from typess import Platforms, PublishResult
+from publishers import PUBLISHERS, Publisher
+from utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+class PublishQueueFullError(Exception):
+    """Raised when a platform's publish queue has no room for another post."""
+
+class PlatformQueue:
+    """
+    A bounded queue of posts for one platform, drained by that platform's own
+    workers. Each API sees at most `concurrency` calls at once, and a backlog
+    on one platform never delays posts to another.
+
+    Posts run in the context of the job that queued them, so they keep its
+    deadline and trace span; a post whose job stopped waiting is skipped, or
+    cancelled if it is already running.
+    """
+
+    def __init__(self, publisher: Publisher, concurrency: int, max_size: int):
+        self.publisher = publisher
+        self.concurrency = concurrency
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._workers: List[asyncio.Task] = []
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"publish-worker-{self.publisher.name}-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the workers. Posts still queued are dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def publish(self, variant: Any, media_url: Optional[str]) -> PublishResult:
+        """Queue a post and wait for its result. Raises PublishQueueFullError if there is no room."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((variant, media_url, future, contextvars.copy_context(), time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise PublishQueueFullError(f"{self.publisher.name} publish queue is full")
+        return await future
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "maxQueued": self._queue.maxsize,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    async def _post(self, variant: Any, media_url: Optional[str], queued_at: float) -> PublishResult:
+        waited = time.monotonic() - queued_at
+        metrics.publish_queue_wait.observe(waited, self.publisher.name)
+        tracing.annotate(queueWait=waited)
+        return await self.publisher.publish(variant, media_url)
+
+    async def _worker(self) -> None:
+        while True:
+            variant, media_url, future, context, queued_at = await self._queue.get()
+            try:
+                # The job stopped waiting (deadline passed or cancelled) while this was queued
+                if future.done():
+                    continue
+                task = asyncio.create_task(self._post(variant, media_url, queued_at), context=context)
+                future.add_done_callback(lambda done, task=task: task.cancel() if done.cancelled() else None)
+                self.running += 1
+                try:
+                    await asyncio.wait((task,))
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                finally:
+                    self.running -= 1
+                self.completed += 1
+                if future.done():
+                    if not task.cancelled():
+                        task.exception()
+                    continue
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+            finally:
+                self._queue.task_done()
+
+class PublishQueues:
+    """A PlatformQueue per registered publisher."""
+
+    def __init__(self, limits: Dict[Platforms, Tuple[int, int]]):
+        # platform -> (worker concurrency, max queue size; 0 = unbounded)
+        self.queues: Dict[Platforms, PlatformQueue] = {
+            platform: PlatformQueue(PUBLISHERS[platform], concurrency, max_size)
+            for platform, (concurrency, max_size) in limits.items()
+        }
+
+    def start(self) -> None:
+        for platform_queue in self.queues.values():
+            platform_queue.start()
+        logger.info(
+            "Started publish workers: "
+            + ", ".join(f"{platform} x{queue.concurrency}" for platform, queue in self.queues.items())
+        )
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(platform_queue.stop() for platform_queue in self.queues.values()))
+
+    async def publish(self, platform: Platforms, variant: Any, media_url: Optional[str]) -> PublishResult:
+        return await self.queues[platform].publish(variant, media_url)
+
+    def depth(self) -> Dict[Platforms, int]:
+        """Posts waiting for a worker, per platform."""
+        return {platform: platform_queue.depth() for platform, platform_queue in self.queues.items()}
+
+    def stats(self) -> Dict[Platforms, Dict[str, int]]:
+        return {platform: platform_queue.stats() for platform, platform_queue in self.queues.items()}
+
+publish_queues = PublishQueues({
+    platform: config.PUBLISH_LIMITS.get(platform, (config.PUBLISH_CONCURRENCY, config.PUBLISH_QUEUE_SIZE))
+    for platform in PUBLISHERS
+})
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from utils.cache import CacheStats, SingleFlight, TTLCache
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(5)))
+        return results, len(flight)
+
+    results, pending = asyncio.run(run())
+    assert results == ["result"] * 5
+    assert calls == [1]
+    assert pending == 0
+
+def test_cancelled_caller_leaves_the_work_running_for_the_others():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "result"
+
+        first = asyncio.create_task(flight.run("key", work))
+        second = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "result"
+
+def test_failed_work_is_forgotten():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def succeed():
+            return "result"
+
+        with pytest.raises(ValueError):
+            await flight.run("key", fail)
+        assert "key" not in flight
+        return await flight.run("key", succeed)
+
+    assert asyncio.run(run()) == "result"
+
+def test_work_started_under_several_keys():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            return {"a": 1, "b": 2}
+
+        flight.start(["a", "b"], work())
+        assert "a" in flight and "b" in flight
+        results = [result[key] for key, result in zip("ab", await asyncio.gather(flight.wait("a"), flight.wait("b")))]
+        await asyncio.sleep(0)
+        return results, len(flight)
+
+    assert asyncio.run(run()) == ([1, 2], 0)
+
+def test_cache_stats():
+    class Cache(CacheStats):
+        def __init__(self):
+            self.memory = TTLCache(10, 60)
+
+    cache = Cache()
+    cache.memory.set("key", "value")
+    cache.hits += 3
+    cache.misses += 1
+    assert cache.stats() == {"hits": 3, "misses": 1, "hitRatio": 0.75, "entries": 1}
+    assert Cache().stats()["hitRatio"] == 0.0
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+import httpx
+
+from publishers import facebook
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, items):
+        self.items = items
+
+    def json(self):
+        return self.items
+
+def test_batch_is_never_resent_whole(monkeypatch):
+    calls = []
+
+    async def http_request(url, method="GET", data=None, max_retries=3, **kwargs):
+        operations = json.loads(data["batch"])
+        calls.append(([operation["relative_url"] for operation in operations], max_retries))
+        if len(calls) == 1:
+            raise httpx.ReadTimeout("timed out")
+        if len(calls) == 2:
+            # The first page posts; the second is throttled
+            return FakeResponse([
+                {"code": 200, "body": json.dumps({"id": "1_1"})},
+                {"code": 400, "body": json.dumps({"error": {"code": 613, "message": "Slow down"}})}
+            ])
+        return FakeResponse([{"code": 200, "body": json.dumps({"id": "2_1"})}])
+
+    monkeypatch.setattr(facebook, "http_request", http_request)
+    results = asyncio.run(facebook.publish_to_pages({"1": "token-1", "2": "token-2"}, "Caption", retry_delay=0))
+
+    assert calls == [
+        (["1/feed", "2/feed"], 0),
+        (["1/feed", "2/feed"], 0),
+        (["2/feed"], 0)
+    ]
+    assert results["1"]["postId"] == "1_1"
+    assert results["2"]["postId"] == "2_1"
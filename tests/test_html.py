@@ -0,0 +1,27 @@
+from utils.html import CHARS_PER_TOKEN, _truncate_words, extract_text
+
+def test_truncate_words_stays_within_limit():
+    text = "lorem ipsum dolor sit amet consectetur adipiscing elit " * 4
+    for limit in range(0, len(text) + 2):
+        result = _truncate_words(text, limit)
+        assert len(result) <= limit
+        if result and len(text) > limit:
+            assert result.endswith("...")
+            assert text.startswith(result[:-3])
+
+def test_truncate_words_keeps_short_text():
+    assert _truncate_words("short text", 10) == "short text"
+
+def test_truncate_words_cuts_on_word_boundary():
+    assert _truncate_words("alpha beta gamma", 12) == "alpha..."
+    # "beta" ends exactly where the room for the ellipsis starts
+    assert _truncate_words("alpha beta gamma", 13) == "alpha beta..."
+    assert _truncate_words("alpha beta gamma", 14) == "alpha beta..."
+    assert _truncate_words("alphabetagamma", 8) == "alpha..."
+
+def test_extract_text_paragraphs_stay_within_budget():
+    paragraph = "<p>" + "word " * 400 + "</p>"
+    content, stats = extract_text(paragraph * 3, token_budget=100)
+    assert len(content) <= int(100 * CHARS_PER_TOKEN * 0.85)
+    assert stats["truncated"]
+    assert content.endswith("...")
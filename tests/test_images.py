@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+import images
+from config import config
+
+def make_post(featured_image=None):
+    # Shaped like typess.PostData, as it arrives in an IncomingJob
+    return {
+        "id": 1,
+        "title": "Title",
+        "url": "https://example.com/post",
+        "excerpt": "Excerpt",
+        "contentHtml": "<p>Some article text.</p>",
+        "featuredImage": featured_image
+    }
+
+def test_generation_budget_starts_when_the_idea_arrives(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_API_KEY", "key")
+    monkeypatch.setattr(config, "IMAGE_SPECULATION", "off")
+
+    async def choose_or_create_image(url, prompt):
+        await asyncio.sleep(0.1)
+        return f"https://images.example.com/{prompt}"
+
+    monkeypatch.setattr(images, "choose_or_create_image", choose_or_create_image)
+
+    async def run():
+        async def slow_idea():
+            # Longer than the image budget itself
+            await asyncio.sleep(0.2)
+            return "idea"
+        return await images.prepare_image(make_post(), slow_idea(), lambda: time.monotonic() + 0.15)
+
+    assert asyncio.run(run()) == "https://images.example.com/idea"
+
+def test_featured_image_is_bounded_from_the_start(monkeypatch):
+    async def validate_image(url):
+        await asyncio.sleep(1)
+        return True
+
+    monkeypatch.setattr(images, "validate_image", validate_image)
+
+    async def run():
+        idea = asyncio.get_running_loop().create_future()
+        return await images.prepare_image(make_post("https://example.com/a.png"), idea, lambda: time.monotonic() + 0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+def test_content_type_reads_the_memory_tier_on_the_loop(tmp_path, monkeypatch):
+    cache = images.GeneratedImageCache(10, 60, directory=str(tmp_path), max_bytes=1024)
+    cache.memory.set("in-memory", {"contentType": "image/png"})
+    cache.records.set("on-disk", b'{"contentType": "image/webp"}')
+    threaded = []
+
+    async def to_thread(function, *args):
+        threaded.append(function)
+        return function(*args)
+
+    monkeypatch.setattr(asyncio, "to_thread", to_thread)
+
+    async def run():
+        return [await cache.content_type(key) for key in ("in-memory", "on-disk", "missing")]
+
+    assert asyncio.run(run()) == ["image/png", "image/webp", "application/octet-stream"]
+    assert threaded == [cache.records.get, cache.records.get]
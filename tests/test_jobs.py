@@ -0,0 +1,69 @@
+import asyncio
+
+import jobs
+from journal import JobJournal
+from jobs import JobQueue
+
+def make_job(run_id):
+    return {"runId": run_id, "dryRun": True, "ts": "2024-01-01T00:00:00Z", "callbackUrl": "http://localhost/cb", "post": {"id": 1}}
+
+def make_checkpoint():
+    return {"variants": None, "mediaResolved": False, "mediaUrl": None, "results": {}}
+
+def test_retry_during_resume_attaches_to_recovered_job():
+    async def run():
+        queue = JobQueue({"default": (1, 0)})
+        restored = queue.restore([(make_job("a"), make_checkpoint()), (make_job("b"), make_checkpoint())])
+        # A /job retry arrives before resume_jobs has queued anything
+        progress, created = queue.enqueue(make_job("b"))
+        assert not created
+        assert progress is restored[1][1]
+        for job, progress, checkpoint in restored:
+            await queue.resume(job, progress, checkpoint)
+        return queue.depth()["default"]
+
+    assert asyncio.run(run()) == 2
+
+def test_restore_skips_jobs_already_active():
+    async def run():
+        queue = JobQueue({"default": (1, 0)})
+        queue.enqueue(make_job("a"))
+        restored = queue.restore([(make_job("a"), make_checkpoint())])
+        return restored, queue.depth()["default"]
+
+    restored, depth = asyncio.run(run())
+    assert restored == []
+    assert depth == 1
+
+def test_retry_after_restart_is_answered_from_the_journal(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.db")
+    result = {"status": "posted", "postId": "1"}
+
+    async def first_run():
+        journal = JobJournal(path)
+        await journal.start()
+        await journal.record_received(make_job("done"))
+        await journal.record_received(make_job("failed"))
+        journal.record_published("done", "twitter", result)
+        await journal.record_callback_queued("cb-1", "done", "http://localhost/cb", b"{}", "sig", 0)
+        journal.record_failed("failed")
+        await journal.stop()
+
+    async def after_restart():
+        journal = JobJournal(path)
+        await journal.start()
+        monkeypatch.setattr(jobs, "journal", journal)
+        queue = JobQueue({"default": (1, 0)})
+        try:
+            await queue.recall(["done", "failed"])
+            return queue.enqueue(make_job("done")), queue.enqueue(make_job("failed"))
+        finally:
+            await journal.stop()
+
+    asyncio.run(first_run())
+    (done, done_created), (failed, failed_created) = asyncio.run(after_restart())
+    assert not done_created
+    assert done["state"] == "completed"
+    assert done["results"] == {"twitter": result}
+    # A failed job is still run again on retry
+    assert failed_created
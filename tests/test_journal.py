@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+from journal import JobJournal
+
+def make_job(run_id):
+    return {"runId": run_id, "dryRun": True, "ts": "2024-01-01T00:00:00Z", "callbackUrl": "http://localhost/cb", "post": {"id": 1}}
+
+def restart(path):
+    """Open the journal as a fresh process would and return the runIds it resumes."""
+    async def run():
+        journal = JobJournal(path)
+        unfinished = await journal.start()
+        await journal.stop()
+        return [job["runId"] for job, _ in unfinished]
+    return asyncio.run(run())
+
+def test_failed_jobs_are_not_resumed(tmp_path):
+    path = str(tmp_path / "data" / "jobs.db")
+
+    async def run():
+        journal = JobJournal(path)
+        await journal.start()
+        await journal.record_received(make_job("failed"))
+        await journal.record_received(make_job("interrupted"))
+        journal.record_failed("failed")
+        await journal.stop()
+
+    asyncio.run(run())
+    assert os.path.exists(path)
+    assert restart(path) == ["interrupted"]
+
+def test_retry_of_failed_job_is_resumed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def run():
+        journal = JobJournal(path)
+        await journal.start()
+        await journal.record_received(make_job("job"))
+        journal.record_variants("job", {"twitter": "x"})
+        journal.record_failed("job")
+        await journal.record_received(make_job("job"))
+        await journal.stop()
+
+    asyncio.run(run())
+    assert restart(path) == ["job"]
+
+def test_duplicate_of_active_job_keeps_its_progress(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def run():
+        journal = JobJournal(path)
+        await journal.start()
+        await journal.record_received(make_job("job"))
+        journal.record_variants("job", {"twitter": "x"})
+        await journal.record_received(make_job("job"))
+        unfinished = await asyncio.to_thread(journal._load_unfinished)
+        await journal.stop()
+        return unfinished
+
+    [(job, checkpoint)] = asyncio.run(run())
+    assert checkpoint["variants"] == {"twitter": "x"}
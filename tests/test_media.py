@@ -0,0 +1,29 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from media import MediaCache, close_media
+
+def jpeg_with_exif(width, height):
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    exif[0x8825] = {1: "N", 2: (51.0, 30.0, 0.0)}  # GPS position
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+def test_linkedin_uploads_get_a_capped_rendition_without_metadata():
+    async def run():
+        cache = MediaCache(10 * 1024 * 1024, 60)
+        source = await cache.put("https://example.com/photo.jpg", jpeg_with_exif(6100, 20), "image/jpeg")
+        try:
+            return source, await cache.rendition(source.url, "linkedin")
+        finally:
+            close_media()
+
+    source, rendition = asyncio.run(run())
+    assert rendition.sha256 != source.sha256
+    with Image.open(io.BytesIO(bytes(rendition.buffer))) as image:
+        assert image.width <= 6012
+        assert not image.getexif()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+import llm
+import pipeline
+from config import config
+from outbox import outbox
+from pipeline import new_job_status, run_job
+from utils.jsonstream import JSONObjectStream
+
+# The completion streamed in pieces; after each piece that closes a field, the
+# stream waits for that platform's publish to start before sending the rest
+PIECES = [
+    ('{"twitter": "Tweet te', None),
+    ('xt, with a comma",', "twitter"),
+    (' "linkedin": "Post {with braces}",', "linkedin"),
+    (' "facebook": "Facebook \\"post\\"",', "facebook"),
+    (' "pinterest": {"title": "Pin", "description": "Pin, described"},', "pinterest"),
+    (' "tumblr": {"title": "Tumblr", "bodyHtml": "<p>Body</p>", "tags": ["a", "b"]},', "tumblr"),
+    (' "imageIdea": "A lighthouse"}', None)
+]
+
+def make_job(run_id="run-1"):
+    return {
+        "runId": run_id,
+        "dryRun": True,
+        "ts": "2024-01-01T00:00:00Z",
+        "callbackUrl": "http://localhost/cb",
+        "post": {
+            "id": 1,
+            "title": "Title",
+            "url": "https://example.com/post",
+            "excerpt": "Excerpt",
+            "contentHtml": "<p>Some article text.</p>",
+            "featuredImage": None
+        }
+    }
+
+def sse(content):
+    chunk = {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "test",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+@pytest.fixture
+def streaming(monkeypatch):
+    """Route the pipeline's completions to a canned SSE stream and record what happens when."""
+    events = []
+    started = {}
+
+    async def body():
+        for piece, platform in PIECES:
+            events.append(("streamed", piece))
+            yield sse(piece)
+            if platform is not None:
+                await asyncio.wait_for(started[platform].wait(), 2)
+        yield b"data: [DONE]\n\n"
+
+    async def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    async def publish_to_platform(platform, variants, media_url, dry_run, until=None):
+        events.append(("publish", platform))
+        started[platform].set()
+        return {"status": "skipped", "caption": str(variants[platform])}
+
+    async def enqueue(job, results):
+        events.append(("callback", job["runId"]))
+
+    client = AsyncOpenAI(api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(llm, "get_openai_client", lambda api_key: client)
+    monkeypatch.setattr(pipeline, "publish_to_platform", publish_to_platform)
+    monkeypatch.setattr(outbox, "enqueue", enqueue)
+    monkeypatch.setattr(config, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(config, "LLM_STREAMING", True)
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "IMAGE_API_KEY", None)
+
+    def run(job, progress):
+        async def main():
+            for platform in pipeline.PUBLISHERS:
+                started[platform] = asyncio.Event()
+            try:
+                # Bounded so a publisher left waiting on a field fails the test instead of hanging it
+                return await asyncio.wait_for(run_job(job, progress), 5)
+            finally:
+                await client.close()
+        return asyncio.run(main())
+
+    return run, events
+
+def test_stream_releases_each_member_when_it_closes():
+    parser = JSONObjectStream()
+    released = [parser.feed(piece) for piece, _ in PIECES]
+    assert released[0] == []
+    assert released[1] == [("twitter", "Tweet text, with a comma")]
+    assert released[2] == [("linkedin", "Post {with braces}")]
+    assert released[3] == [("facebook", 'Facebook "post"')]
+    assert released[4] == [("pinterest", {"title": "Pin", "description": "Pin, described"})]
+    assert released[-1] == [("imageIdea", "A lighthouse")]
+    assert parser.complete
+
+def test_each_platform_publishes_as_soon_as_its_field_streams(streaming):
+    run, events = streaming
+    job = make_job()
+    progress = new_job_status(job)
+    results = run(job, progress)
+
+    # Every publish starts right after the piece that closed its field, before the next one streams
+    assert events == [
+        ("streamed", PIECES[0][0]),
+        ("streamed", PIECES[1][0]),
+        ("publish", "twitter"),
+        ("streamed", PIECES[2][0]),
+        ("publish", "linkedin"),
+        ("streamed", PIECES[3][0]),
+        ("publish", "facebook"),
+        ("streamed", PIECES[4][0]),
+        ("publish", "pinterest"),
+        ("streamed", PIECES[5][0]),
+        ("publish", "tumblr"),
+        ("streamed", PIECES[6][0]),
+        ("callback", "run-1")
+    ]
+    assert results["twitter"] == {"status": "skipped", "caption": "Tweet text, with a comma"}
+    assert progress["state"] == "completed"
+    assert progress["stages"] == {"llm": "done", "image": "done", "publish": "done", "callback": "done"}
+
+def test_generation_failure_fails_the_fields_still_pending(streaming, monkeypatch):
+    run, events = streaming
+    job = make_job()
+    progress = new_job_status(job)
+
+    async def generate_variants(title, url, excerpt, content, on_field=None):
+        on_field("twitter", "Tweet")
+        await asyncio.sleep(0)
+        raise RuntimeError("generation broke")
+
+    monkeypatch.setattr(pipeline, "generate_variants", generate_variants)
+    with pytest.raises(RuntimeError, match="generation broke"):
+        run(job, progress)
+
+    # The released field still published and nothing waited on the others
+    assert events == [("publish", "twitter")]
+    assert progress["state"] == "failed"
+    assert progress["stages"]["llm"] == "failed"
+
+def test_generation_failure_cancels_publishes_under_way(streaming, monkeypatch):
+    events = []
+    job = make_job()
+    progress = new_job_status(job)
+
+    async def generate_variants(title, url, excerpt, content, on_field=None):
+        on_field("twitter", "Tweet")
+        await asyncio.sleep(0.05)
+        raise RuntimeError("generation broke")
+
+    async def publish_to_platform(platform, variants, media_url, dry_run, until=None):
+        events.append(("publishing", platform))
+        await asyncio.sleep(0.1)
+        events.append(("posted", platform))
+        return {"status": "posted"}
+
+    monkeypatch.setattr(pipeline, "generate_variants", generate_variants)
+    monkeypatch.setattr(pipeline, "publish_to_platform", publish_to_platform)
+
+    async def main():
+        with pytest.raises(RuntimeError, match="generation broke"):
+            await run_job(job, progress)
+        # Give a publish that wasn't cancelled the time to finish posting
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert events == [("publishing", "twitter")]
+    assert progress["state"] == "failed"
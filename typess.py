@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Optional, Literal
+from typing import Dict, TypedDict, List, Optional, Literal
 from datetime import datetime
 
 Platforms = Literal["twitter", "linkedin", "facebook", "pinterest", "tumblr"]
@@ -18,6 +18,12 @@ class IncomingJob(TypedDict):
     callbackUrl: str
     post: PostData
 
+class TargetResult(TypedDict):
+    status: Literal["posted", "failed"]
+    postId: Optional[str]
+    permalink: Optional[str]
+    error: Optional[str]
+
 class PublishResult(TypedDict):
     status: Literal["posted", "failed", "skipped", "pending"]
     caption: Optional[str]
@@ -25,6 +31,7 @@ class PublishResult(TypedDict):
     postId: Optional[str]
     permalink: Optional[str]
     error: Optional[str]
+    targets: Optional[Dict[str, TargetResult]]  # Per destination (e.g. Facebook page) when posting to several
 
 class PinterestVariant(TypedDict):
     title: str
@@ -45,4 +52,41 @@ class LLMOutput(TypedDict):
 
 class CallbackPayload(TypedDict):
     postId: int
-    results: dict[Platforms, PublishResult]
\ No newline at end of file
+    results: dict[Platforms, PublishResult]
+
+JobState = Literal["queued", "running", "completed", "failed"]
+JobStage = Literal["llm", "image", "publish", "callback"]
+StageState = Literal["pending", "running", "done", "failed"]
+
+class ExtractionStats(TypedDict):
+    htmlChars: int
+    textChars: int
+    rawTokens: int
+    estimatedTokens: int
+    blocks: int
+    droppedElements: int
+    truncated: bool
+
+class JobStatus(TypedDict):
+    runId: str
+    postId: int
+    state: JobState
+    stages: dict[JobStage, StageState]
+    results: Optional[dict[Platforms, PublishResult]]
+    error: Optional[str]
+    extraction: Optional[ExtractionStats]
+    acceptedAt: float
+    updatedAt: float
+
+class JobCheckpoint(TypedDict):
+    variants: Optional[LLMOutput]
+    mediaResolved: bool
+    mediaUrl: Optional[str]
+    results: dict[Platforms, PublishResult]
+
+class RenditionProfile(TypedDict, total=False):
+    maxWidth: int
+    maxHeight: int
+    aspect: float  # Width / height to centre-crop to
+    format: Literal["JPEG", "WEBP"]
+    quality: int
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+class TTLCache(Generic[V]):
+    """
+    Bounded LRU mapping whose entries expire after a fixed time-to-live.
+    Expired entries are evicted lazily on access and when inserting.
+    With `weigh` and `max_weight` set, the total weight of entries (e.g. their
+    size in bytes) is bounded as well as their number.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        max_weight: Optional[int] = None,
+        weigh: Optional[Callable[[V], int]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self._data: "OrderedDict[Hashable, tuple[float, V, int]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self.pop(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        self.pop(key)
+        weight = self.weigh(value) if self.weigh else 0
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value, weight)
+        self.weight += weight
+        self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[V]:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.weight -= entry[2]
+        return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Oldest entries are at the front; drop expired ones first, then trim to size
+        while self._data:
+            key, (expires_at, _, _) = next(iter(self._data.items()))
+            if (
+                expires_at >= now
+                and len(self._data) <= self.max_entries
+                and (self.max_weight is None or self.weight <= self.max_weight)
+            ):
+                break
+            self.pop(key)
+
+class CacheStats:
+    """
+    Hit and miss counters reported by stats(). Caches using it count into
+    `hits` and `misses` and keep their in-memory tier in `memory`; they can
+    extend stats() with fields of their own.
+    """
+
+    hits = 0
+    misses = 0
+    memory: TTLCache
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / total if total else 0.0,
+            "entries": len(self.memory)
+        }
+
+class SingleFlight(Generic[V]):
+    """
+    Work in progress by key, so concurrent callers asking for the same thing
+    (a download, an upload, a generation) share one task instead of repeating
+    it. Waiting is shielded: a caller giving up doesn't cancel the work for
+    the others. A key is forgotten as soon as its task finishes, whether it
+    succeeded or not.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, "asyncio.Task[V]"] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def start(self, keys: Iterable[Hashable], work: Awaitable[V]) -> "asyncio.Task[V]":
+        """Run `work` in a task registered under every key in `keys`."""
+        keys = list(keys)
+        task = asyncio.create_task(work)
+        for key in keys:
+            self._tasks[key] = task
+
+        def forget(_: asyncio.Task) -> None:
+            for key in keys:
+                if self._tasks.get(key) is task:
+                    del self._tasks[key]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def wait(self, key: Hashable) -> V:
+        """The result of the work in flight under `key`."""
+        return await asyncio.shield(self._tasks[key])
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[V]]) -> V:
+        """Join the work in flight under `key`, or start `work()` if there is none."""
+        if key not in self._tasks:
+            self.start([key], work())
+        return await self.wait(key)
+
+class DiskCache:
+    """
+    Size- and age-bounded cache of byte blobs stored as files in a directory.
+    Files are named by key and written atomically; least recently used files
+    are deleted once the directory exceeds max_bytes. The directory is created
+    on the first write. Methods block, so call them through asyncio.to_thread
+    from async code.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float, suffix: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self._size: Optional[int] = None
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Return the file path for a live entry, refreshing its recency."""
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat.st_mtime + self.ttl < time.time():
+            self._remove(path, stat.st_size)
+            return None
+        os.utime(path)
+        return path
+
+    def set(self, key: str, data: bytes) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._track(len(data))
+        return path
+
+    def _track(self, added: int) -> None:
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._scan())
+        else:
+            self._size += added
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        # Trim to 90% so eviction doesn't run on every write near the limit
+        entries = sorted(self._scan())
+        self._size = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        now = time.time()
+        for mtime, path, size in entries:
+            if self._size <= target and mtime + self.ttl >= now:
+                break
+            self._remove(path, size)
+
+    def _remove(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if self._size is not None:
+            self._size -= size
@@ -0,0 +1,114 @@
+import time
+import logging
+from typing import Any, Dict, Literal
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream host.
+
+    closed: requests flow; consecutive failures are counted.
+    open: requests fail fast until reset_timeout has passed.
+    half_open: up to half_open_max trial requests are let through; a success
+    closes the circuit and a failure opens it again.
+    """
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float, half_open_max: int):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state: CircuitState = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now. Counts half-open trials."""
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self._transition("half_open")
+            self.opened_at = now
+            self.trials = 0
+        if self.state == "half_open":
+            if self.trials >= self.half_open_max:
+                # A trial that never reported back (e.g. cancelled) mustn't wedge the circuit
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.opened_at = now
+                self.trials = 0
+            self.trials += 1
+        return True
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if the request may not be sent."""
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit open for {self.host}")
+
+    def is_open(self) -> bool:
+        """Whether requests would currently be rejected, without counting a trial."""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self.state == "half_open" and self.trials >= self.half_open_max
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != "closed":
+            self._transition("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition("open")
+
+    def _transition(self, state: CircuitState) -> None:
+        if state != self.state:
+            log = logger.warning if state == "open" else logger.info
+            log(f"Circuit for {self.host}: {self.state} -> {state}")
+        self.state = state
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "openFor": round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 2)
+                if self.state == "open" else 0.0,
+            "rejected": self.rejected
+        }
+
+class CircuitBreakers:
+    """Lazily created circuit breakers keyed by host."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, half_open_max: int):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def for_host(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(
+                host, self.failure_threshold, self.reset_timeout, self.half_open_max
+            )
+        return breaker
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        return self.for_host(urlsplit(url).netloc)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {host: breaker.snapshot() for host, breaker in self._breakers.items()}
@@ -0,0 +1,52 @@
+from typing import TYPE_CHECKING, Dict
+
+import httpx
+
+from utils import tracing
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# One OpenAI client per API key, so LLM and image calls reuse pooled connections
+_openai_clients: Dict[str, "AsyncOpenAI"] = {}
+
+async def _start_attempt(request: httpx.Request) -> None:
+    # The SDK retries internally, so each attempt gets its own span
+    request.extensions["span"] = tracing.start_span(
+        "http_request",
+        method=request.method,
+        host=request.url.netloc.decode(),
+        path=request.url.path,
+        attempt=int(request.headers.get("x-stainless-retry-count", 0)) + 1,
+        requestBytes=int(request.headers.get("content-length", 0))
+    )
+
+async def _end_attempt(response: httpx.Response) -> None:
+    # Ends at the response headers; a streamed body is timed by the caller's span
+    span = response.request.extensions.get("span")
+    if span is not None:
+        span.set(statusCode=response.status_code)
+        if response.status_code >= 400:
+            span.fail(f"HTTP {response.status_code}")
+        span.end()
+
+def get_openai_client(api_key: str) -> "AsyncOpenAI":
+    """Return the shared AsyncOpenAI client for an API key."""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        client = _openai_clients[api_key] = AsyncOpenAI(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(
+                event_hooks={"request": [_start_attempt], "response": [_end_attempt]}
+            )
+        )
+    return client
+
+async def close_openai_clients() -> None:
+    """Close every shared OpenAI client."""
+    clients = list(_openai_clients.values())
+    _openai_clients.clear()
+    for client in clients:
+        await client.close()
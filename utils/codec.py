@@ -0,0 +1,123 @@
+from typing import Any, Callable, Dict, List, Literal, Type, TypeVar, Union, get_args, get_origin, get_type_hints, is_typeddict
+
+import orjson
+
+T = TypeVar("T")
+
+Validator = Callable[[Any, str], Any]
+
+class ValidationError(ValueError):
+    """Raised when a decoded document doesn't match its schema."""
+
+def decode(data: Union[bytes, str], schema: Type[T]) -> T:
+    """
+    Parse JSON and validate it against a typess schema (a TypedDict, or a
+    List/Optional/Literal of one) in one pass. Unknown keys are dropped and
+    Optional keys that are missing are filled with None. Raises
+    ValidationError naming the first offending field.
+    """
+    try:
+        value = orjson.loads(data)
+    except orjson.JSONDecodeError as e:
+        raise ValidationError(f"Invalid JSON: {e}")
+    return validator(schema)(value, "")
+
+def encode(value: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON."""
+    return orjson.dumps(value)
+
+_validators: Dict[Any, Validator] = {}
+
+def validator(schema: Any) -> Validator:
+    """The compiled validator for a schema; built once per schema and reused."""
+    check = _validators.get(schema)
+    if check is None:
+        check = _validators[schema] = _compile(schema)
+    return check
+
+def _fail(path: str, expected: str, value: Any) -> ValidationError:
+    return ValidationError(f"{path or 'body'}: expected {expected}, got {type(value).__name__}")
+
+def _compile(schema: Any) -> Validator:
+    if schema is Any:
+        return lambda value, path: value
+    if is_typeddict(schema):
+        return _compile_typeddict(schema)
+
+    origin = get_origin(schema)
+    if origin is Union:
+        args = get_args(schema)
+        nullable = type(None) in args
+        options = [validator(arg) for arg in args if arg is not type(None)]
+
+        def check_union(value, path):
+            if value is None and nullable:
+                return None
+            for option in options:
+                try:
+                    return option(value, path)
+                except ValidationError:
+                    if len(options) == 1:
+                        raise
+            raise _fail(path, str(schema), value)
+        return check_union
+    if origin is Literal:
+        allowed = set(get_args(schema))
+
+        def check_literal(value, path):
+            if value not in allowed:
+                raise ValidationError(f"{path or 'body'}: expected one of {sorted(allowed)}, got {value!r}")
+            return value
+        return check_literal
+    if origin in (list, List):
+        (item_schema,) = get_args(schema) or (Any,)
+        check_item = validator(item_schema)
+
+        def check_list(value, path):
+            if not isinstance(value, list):
+                raise _fail(path, "an array", value)
+            return [check_item(item, f"{path}[{i}]") for i, item in enumerate(value)]
+        return check_list
+    if origin in (dict, Dict):
+        key_schema, value_schema = get_args(schema) or (str, Any)
+        check_key, check_value = validator(key_schema), validator(value_schema)
+
+        def check_dict(value, path):
+            if not isinstance(value, dict):
+                raise _fail(path, "an object", value)
+            return {check_key(k, path): check_value(v, f"{path}.{k}") for k, v in value.items()}
+        return check_dict
+    if schema is float:
+        def check_float(value, path):
+            if type(value) not in (int, float):
+                raise _fail(path, "a number", value)
+            return float(value)
+        return check_float
+    if schema in (str, int, bool):
+        # Exact type match: bool is an int subclass and must not pass for one
+        def check_exact(value, path):
+            if type(value) is not schema:
+                raise _fail(path, schema.__name__, value)
+            return value
+        return check_exact
+    raise TypeError(f"Unsupported schema type: {schema!r}")
+
+def _compile_typeddict(schema: Any) -> Validator:
+    fields = []
+    for name, hint in get_type_hints(schema).items():
+        nullable = get_origin(hint) is Union and type(None) in get_args(hint)
+        fields.append((name, validator(hint), name in schema.__required_keys__, nullable))
+
+    def check_object(value, path):
+        if not isinstance(value, dict):
+            raise _fail(path, "an object", value)
+        out = {}
+        for name, check, required, nullable in fields:
+            if name in value:
+                out[name] = check(value[name], f"{path}.{name}" if path else name)
+            elif nullable:
+                out[name] = None
+            elif required:
+                raise ValidationError(f"{path + '.' if path else ''}{name}: missing")
+        return out
+    return check_object
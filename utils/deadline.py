@@ -0,0 +1,44 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() deadline for the work running in the current task
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when there is no time left in the current deadline."""
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def timeout_for(default: float) -> float:
+    """The smaller of `default` and the time left; raises if the deadline has passed."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return min(default, left)
+
+async def run_until(awaitable: Awaitable[T], until: float) -> T:
+    """
+    Run `awaitable` with a deadline of `until` (time.monotonic()), or the
+    enclosing deadline if that is sooner. Everything it awaits sees the
+    deadline through remaining()/timeout_for(), and the work is cancelled
+    with asyncio.TimeoutError when it expires.
+    """
+    current = _deadline.get()
+    if current is not None:
+        until = min(until, current)
+    token = _deadline.set(until)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=max(0.0, until - time.monotonic()))
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,159 @@
+import math
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+from typess import ExtractionStats
+
+# Rough average for English prose with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+# Elements whose content never helps the LLM write social copy
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "select", "figure"
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = HEADING_TAGS | {
+    "p", "div", "section", "article", "li", "blockquote", "pre", "br",
+    "tr", "dd", "dt", "ul", "ol", "table"
+}
+VOID_TAGS = {"br", "img", "hr", "input", "meta", "link", "source", "wbr", "area", "col", "embed"}
+
+_WHITESPACE = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+class _TextExtractor(HTMLParser):
+    """Collects (is_heading, text) blocks, skipping boilerplate elements."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Tuple[bool, str]] = []
+        self.chars = 0
+        self.dropped = 0
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._heading = False
+        self._buffer: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._flush()
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS:
+            self._skip_tag = tag
+            self._skip_depth = 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in HEADING_TAGS
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+                    self.dropped += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = False
+
+    def handle_data(self, data):
+        if self._skip_tag is None:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def _flush(self):
+        text = _WHITESPACE.sub(" ", "".join(self._buffer)).strip()
+        self._buffer = []
+        if text:
+            self.blocks.append((self._heading, text))
+            self.chars += len(text)
+
+def extract_text(
+    html: str,
+    token_budget: int,
+    chunk_size: int = 8192
+) -> Tuple[str, ExtractionStats]:
+    """
+    Convert post HTML into plain text for an LLM prompt within a token budget.
+
+    The HTML is fed to the parser in chunks and parsing stops once there is
+    comfortably more text than the budget can hold. Paragraphs are kept in
+    order until most of the budget is used; the remainder is reserved for
+    later headings so the model still sees the article's outline.
+    """
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    paragraph_chars = int(budget_chars * 0.85)
+
+    parser = _TextExtractor()
+    consumed = 0
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        consumed = min(start + chunk_size, len(html))
+        if parser.chars > budget_chars * 2:
+            break
+    parser.close()
+
+    lines: List[str] = []
+    used = 0
+    truncated = consumed < len(html)
+    paragraphs_full = False
+    for is_heading, text in parser.blocks:
+        if is_heading:
+            line = f"## {text}"
+            if used + len(line) + 1 <= budget_chars:
+                lines.append(line)
+                used += len(line) + 1
+            else:
+                truncated = True
+            continue
+        if paragraphs_full:
+            truncated = True
+            continue
+        room = paragraph_chars - used
+        if len(text) + 1 > room:
+            paragraphs_full = True
+            truncated = True
+            text = _truncate_words(text, room - 1)
+            if not text:
+                continue
+        lines.append(text)
+        used += len(text) + 1
+
+    content = "\n".join(lines)
+    return content, ExtractionStats(
+        htmlChars=len(html),
+        textChars=len(content),
+        rawTokens=estimate_tokens(html),
+        estimatedTokens=estimate_tokens(content),
+        blocks=len(lines),
+        droppedElements=parser.dropped,
+        truncated=truncated
+    )
+
+def _truncate_words(text: str, limit: int) -> str:
+    """Cut text to at most limit chars on a word boundary, adding an ellipsis."""
+    if len(text) <= limit:
+        return text
+    if limit <= 3:
+        return ""
+    # Leave room for the ellipsis. The character just past the room shows whether
+    # the last word in it ends there; without any whitespace the word is cut.
+    head = text[:limit - 2]
+    match = re.match(r"(.*\S)\s", head, re.S)
+    cut = match.group(1) if match else head[:-1].strip()
+    return cut + "..." if cut else ""
@@ -1,50 +1,228 @@
 import httpx
 import asyncio
 import logging
-from typing import Any, Dict
+import ssl
+import time
+from typing import Any, Dict, Generator, Optional, Union
+from urllib.parse import urlsplit
+from oauthlib import oauth1
+from config import config
+from utils.ratelimit import RateLimiter, RateLimitedError
+from utils.circuit import CircuitBreakers, CircuitOpenError
+from utils import deadline, metrics, tracing
 
 logger = logging.getLogger(__name__)
 
+# App-scoped client shared by every publisher and the callback
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: Dict[str, asyncio.Semaphore] = {}
+
+# Token buckets per upstream host, shared across all in-flight jobs
+rate_limiter = RateLimiter(
+    default=(config.RATE_LIMIT_DEFAULT_RPS, config.RATE_LIMIT_DEFAULT_BURST),
+    overrides=config.RATE_LIMITS,
+    default_backoff=config.RATE_LIMIT_BACKOFF
+)
+
+# Circuit breakers per upstream host; an open circuit fails requests fast
+circuit_breakers = CircuitBreakers(
+    failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=config.CIRCUIT_RESET_TIMEOUT,
+    half_open_max=config.CIRCUIT_HALF_OPEN_MAX
+)
+
+def create_transport(verify: Union[bool, ssl.SSLContext] = True) -> httpx.AsyncHTTPTransport:
+    """The pooled transport with keep-alive connections behind the shared client."""
+    return httpx.AsyncHTTPTransport(
+        verify=verify,
+        http2=config.HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+def _create_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=transport or create_transport(), timeout=config.HTTP_TIMEOUT)
+
+async def init_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Create the shared client. Called from the app lifespan. A custom
+    `transport` (e.g. one routing upstream hosts to local stand-ins in
+    benchmarks) must be installed before the lifespan starts.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client(transport)
+    return _client
+
+async def close_client() -> None:
+    """Close the shared client and release pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_limits.clear()
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+class OAuth1Auth(httpx.Auth):
+    """
+    OAuth 1.0a request signing. Each attempt is signed afresh, so retries get
+    their own nonce and timestamp. Form-encoded bodies are part of the
+    signature; multipart bodies are not, and are never read into memory.
+    """
+
+    def __init__(self, consumer_key: str, consumer_secret: str, token: str, token_secret: str):
+        self._client = oauth1.Client(
+            consumer_key,
+            client_secret=consumer_secret,
+            resource_owner_key=token,
+            resource_owner_secret=token_secret
+        )
+
+    def auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        content_type = "application/x-www-form-urlencoded"
+        if request.headers.get("content-type", "").startswith(content_type) and request.content:
+            _, signed, _ = self._client.sign(
+                str(request.url),
+                request.method,
+                body=request.content.decode(),
+                headers={"Content-Type": content_type}
+            )
+        else:
+            _, signed, _ = self._client.sign(str(request.url), request.method)
+        request.headers["Authorization"] = signed["Authorization"]
+        yield request
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    """Cap concurrent requests to a single host."""
+    host = urlsplit(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(config.HTTP_MAX_CONNECTIONS_PER_HOST)
+    return _host_limits[host]
+
 async def http_request(
-    url: str, 
-    method: str = "GET", 
-    headers: Dict[str, str] = None, 
+    url: str,
+    method: str = "GET",
+    headers: Dict[str, str] = None,
     json: Any = None,
     data: Any = None,
-    timeout: int = 30,
+    content: Any = None,
+    files: Any = None,
+    auth: Optional[httpx.Auth] = None,
+    timeout: Optional[float] = None,
     max_retries: int = 3,
     retry_delay: float = 1.0
 ) -> httpx.Response:
     """
     Make an HTTP request with retry logic for transient errors.
+    Requests wait for the host's rate limiter, and a 429 pauses that host for
+    everyone instead of using up a retry. Connection errors, timeouts and 5xx
+    responses feed the host's circuit breaker; while it is open, requests fail
+    immediately with CircuitOpenError. Inside a job deadline (utils.deadline),
+    each attempt's timeout is capped at the time left and no retry is started
+    that couldn't finish in time. `timeout` defaults to config.HTTP_TIMEOUT.
+    Each attempt is recorded as a tracing span.
     """
     headers = headers or {}
+    timeout = config.HTTP_TIMEOUT if timeout is None else timeout
     retry_count = 0
-    
+    rate_limit_waits = 0
+    client = get_client()
+    breaker = circuit_breakers.for_url(url)
+    parts = urlsplit(url)
+    host, path = parts.netloc, parts.path
+
     while retry_count <= max_retries:
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    json=json,
-                    data=data,
-                    timeout=timeout
-                )
+        with tracing.span(
+            "http_request",
+            method=method,
+            host=host,
+            path=path,
+            attempt=retry_count + rate_limit_waits + 1
+        ) as span:
+            try:
+                breaker.check()
+                queued = time.perf_counter()
+                await rate_limiter.acquire(url, max_wait=deadline.timeout_for(config.RATE_LIMIT_MAX_WAIT))
+                started = time.perf_counter()
+                span.set(rateLimitWait=started - queued)
+                try:
+                    async with _host_limit(url):
+                        response = await client.request(
+                            method=method,
+                            url=url,
+                            headers=headers,
+                            json=json,
+                            data=data,
+                            content=content,
+                            files=files,
+                            auth=auth,
+                            timeout=deadline.timeout_for(timeout)
+                        )
+                except httpx.TransportError:
+                    breaker.record_failure()
+                    metrics.http_attempts.inc(host, "transport")
+                    raise
+                finally:
+                    metrics.http_duration.observe(time.perf_counter() - started, host)
                 
+                status_code = response.status_code
+                metrics.http_attempts.inc(host, "429" if status_code == 429 else f"{status_code // 100}xx")
+                span.set(
+                    statusCode=status_code,
+                    requestBytes=int(response.request.headers.get("content-length", 0)),
+                    responseBytes=len(response.content)
+                )
+                if status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+                # Wait out the upstream's rate-limit window in the local queue
+                if rate_limiter.observe(url, response) is not None and rate_limit_waits < config.RATE_LIMIT_MAX_WAITS:
+                    rate_limit_waits += 1
+                    metrics.http_retries.inc(host, "rate_limit")
+                    span.set(retry="rate_limit")
+                    continue
+
                 # Retry on server errors and rate limits
-                if response.status_code >= 500 or response.status_code == 429:
-                    raise httpx.HTTPError(f"Server error: {response.status_code}")
-                    
+                if status_code >= 500 or status_code == 429:
+                    raise httpx.HTTPError(f"Server error: {status_code}")
+
+                metrics.http_requests.inc(host, "ok" if status_code < 400 else "error")
                 return response
-                
-        except (httpx.HTTPError, httpx.TimeoutException) as e:
-            retry_count += 1
-            if retry_count > max_retries:
-                logger.error(f"HTTP request failed after {max_retries} retries: {e}")
+
+            except (RateLimitedError, CircuitOpenError) as e:
+                logger.error(f"HTTP request not sent: {e}")
+                metrics.http_requests.inc(host, "not_sent")
                 raise
+
+            except (httpx.HTTPError, httpx.TimeoutException) as e:
+                retry_count += 1
+                if retry_count > max_retries:
+                    logger.error(f"HTTP request failed after {max_retries} retries: {e}")
+                    metrics.http_requests.inc(host, "failed")
+                    raise
                 
-            logger.warning(f"HTTP request failed (attempt {retry_count}/{max_retries}), retrying in {retry_delay}s: {e}")
-            await asyncio.sleep(retry_delay)
-            retry_delay *= 2  # Exponential backoff
\ No newline at end of file
+                time_left = deadline.remaining()
+                if time_left is not None and time_left <= retry_delay:
+                    logger.error(f"HTTP request failed with no time left to retry: {e}")
+                    metrics.http_requests.inc(host, "failed")
+                    raise
+
+                metrics.http_retries.inc(host, "error")
+                span.fail(e)
+                span.set(retry="error", retryDelay=retry_delay)
+
+                logger.warning(f"HTTP request failed (attempt {retry_count}/{max_retries}), retrying in {retry_delay}s: {e}")
+
+        await asyncio.sleep(retry_delay)
+        retry_delay *= 2  # Exponential backoff
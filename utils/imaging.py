@@ -0,0 +1,69 @@
+import io
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps
+
+from typess import RenditionProfile
+
+def transcode(data: bytes, profiles: Dict[str, RenditionProfile]) -> Dict[str, Tuple[bytes, str]]:
+    """
+    Decode an image once and render it for each profile. Returns the encoded
+    bytes and content type per profile key. Metadata such as EXIF is dropped;
+    the orientation it records is applied first.
+
+    CPU-bound: run it in a process pool, not on the event loop.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        if getattr(source, "is_animated", False):
+            # Re-encoding would drop the animation
+            content_type = Image.MIME.get(source.format, "application/octet-stream")
+            return {key: (data, content_type) for key in profiles}
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    return {key: _render(image, profile) for key, profile in profiles.items()}
+
+def _render(image: Image.Image, profile: RenditionProfile) -> Tuple[bytes, str]:
+    aspect = profile.get("aspect")
+    if aspect:
+        image = _crop_to_aspect(image, aspect)
+
+    max_width = profile.get("maxWidth") or image.width
+    max_height = profile.get("maxHeight") or image.height
+    scale = min(1.0, max_width / image.width, max_height / image.height)
+    if scale < 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    image_format = profile.get("format", "JPEG").upper()
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = _flatten(image)
+
+    out = io.BytesIO()
+    options = {"quality": profile.get("quality", 85), "optimize": True}
+    if image_format == "JPEG":
+        options["progressive"] = True
+    if "icc_profile" in image.info:
+        options["icc_profile"] = image.info["icc_profile"]
+    image.save(out, image_format, **options)
+    return out.getvalue(), Image.MIME[image_format]
+
+def _crop_to_aspect(image: Image.Image, aspect: float) -> Image.Image:
+    """Centre-crop to width / height == aspect."""
+    width, height = image.size
+    if width / height > aspect:
+        new_width = round(height * aspect)
+        left = (width - new_width) // 2
+        return image.crop((left, 0, left + new_width, height))
+    new_height = round(width / aspect)
+    top = (height - new_height) // 2
+    return image.crop((0, top, width, top + new_height))
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Convert to RGB, compositing any transparency onto white."""
+    if image.mode == "P":
+        image = image.convert("RGBA")
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
@@ -0,0 +1,59 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+class JSONObjectStream:
+    """
+    Incremental parser for a single JSON object arriving in chunks.
+
+    feed() returns the top-level members completed by each chunk as
+    (key, value) pairs, so callers can act on a field as soon as its value is
+    closed instead of waiting for the whole document.
+    """
+
+    def __init__(self):
+        self.members: Dict[str, Any] = {}
+        self.complete = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = -1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        completed: List[Tuple[str, Any]] = []
+        self._text += chunk
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = pos + 1
+            elif char in "}]":
+                if self._depth == 1:
+                    self._close_member(text[self._member_start:pos], completed)
+                    self.complete = True
+                self._depth -= 1
+            elif char == "," and self._depth == 1:
+                self._close_member(text[self._member_start:pos], completed)
+                self._member_start = pos + 1
+        self._pos = len(text)
+        return completed
+
+    def _close_member(self, member: str, completed: List[Tuple[str, Any]]) -> None:
+        if not member.strip():
+            return
+        for key, value in json.loads("{" + member + "}").items():
+            self.members[key] = value
+            completed.append((key, value))
@@ -0,0 +1,165 @@
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, TypeVar
+
+# Metrics are only updated from the event loop thread, so plain dicts suffice:
+# an update is a dict lookup and an add, with no locks.
+
+Labels = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+class Gauge(Metric):
+    """
+    A metric whose values are read from `collect` at scrape time, costing
+    nothing in between. kind="counter" exposes a monotonic count kept elsewhere.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge"
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.collect().items()
+        ]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last)..., sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {int(cumulative)}")
+        return lines
+
+M = TypeVar("M", bound=Metric)
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+stage_duration = registry.register(Histogram(
+    "job_stage_duration_seconds",
+    "Time spent in each job stage; platform is set for the publish stage.",
+    ("stage", "platform")
+))
+publish_queue_wait = registry.register(Histogram(
+    "publish_queue_wait_seconds",
+    "Time posts wait in their platform's publish queue.",
+    ("platform",)
+))
+publish_results = registry.register(Counter(
+    "publish_results_total",
+    "PublishResult statuses by platform.",
+    ("platform", "status")
+))
+http_requests = registry.register(Counter(
+    "http_requests_total",
+    "Outbound requests by host and final outcome (ok, error, failed, not_sent).",
+    ("host", "outcome")
+))
+http_attempts = registry.register(Counter(
+    "http_attempts_total",
+    "Outbound request attempts by host and status class (2xx, 4xx, 5xx, 429, transport).",
+    ("host", "status")
+))
+http_retries = registry.register(Counter(
+    "http_retries_total",
+    "Outbound request retries by host and reason (error or rate_limit).",
+    ("host", "reason")
+))
+http_duration = registry.register(Histogram(
+    "http_attempt_duration_seconds",
+    "Duration of each outbound request attempt by host.",
+    ("host",)
+))
+callbacks = registry.register(Counter(
+    "callbacks_total",
+    "WordPress callbacks by outcome (delivered, retried, dropped).",
+    ("outcome",)
+))
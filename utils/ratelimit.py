@@ -0,0 +1,160 @@
+import asyncio
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Header pairs platforms use to report the remaining quota and when it resets
+REMAINING_HEADERS = ("x-rate-limit-remaining", "x-ratelimit-remaining")
+RESET_HEADERS = ("x-rate-limit-reset", "x-ratelimit-reset")
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After is either a number of seconds or an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _parse_reset(value: str) -> Optional[float]:
+    """Reset headers are epoch seconds (Twitter) or seconds from now (Pinterest)."""
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    if reset > 1e9:
+        reset -= time.time()
+    return max(0.0, reset)
+
+class RateLimitedError(httpx.HTTPError):
+    """Raised when a host's rate-limit window is further away than we are willing to wait."""
+
+class TokenBucket:
+    """
+    Token bucket for one upstream host. Callers wait in line for a token, and
+    the bucket can be paused until a time the upstream told us to come back.
+    A rate of 0 means no local limit; the bucket then only honours pauses.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, max_wait: Optional[float] = None) -> float:
+        """Wait for a token. Returns the time spent waiting."""
+        started = time.monotonic()
+        if max_wait is not None and self.blocked_until - started > max_wait:
+            raise RateLimitedError(f"Rate limited for another {self.blocked_until - started:.0f}s")
+        self.waiting += 1
+        try:
+            # The lock keeps waiters in FIFO order
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self.blocked_until:
+                        delay = self.blocked_until - now
+                    elif self.rate <= 0:
+                        return now - started
+                    elif self.tokens >= 1:
+                        self.tokens -= 1
+                        return now - started
+                    else:
+                        delay = (1 - self.tokens) / self.rate
+                    await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hold all requests for the given number of seconds."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def limit_remaining(self, remaining: float) -> None:
+        """Never hand out more tokens than the upstream says we have left."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+            "blockedFor": round(max(0.0, self.blocked_until - now), 2),
+            "waiting": self.waiting,
+            "throttled": self.throttled
+        }
+
+class RateLimiter:
+    """Per-host token buckets shared by every in-flight job."""
+
+    def __init__(self, default: Tuple[float, float], overrides: Dict[str, Tuple[float, float]], default_backoff: float):
+        self.default = default
+        self.overrides = overrides
+        self.default_backoff = default_backoff
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, capacity = self.overrides.get(host, self.default)
+            bucket = self._buckets[host] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def acquire(self, url: str, max_wait: Optional[float] = None) -> float:
+        return await self.bucket(url).acquire(max_wait)
+
+    def observe(self, url: str, response: httpx.Response) -> Optional[float]:
+        """
+        Update the host's bucket from rate-limit headers. Returns the pause in
+        seconds if the response was a 429, else None.
+        """
+        bucket = self.bucket(url)
+        headers = response.headers
+
+        remaining = next((headers[h] for h in REMAINING_HEADERS if h in headers), None)
+        reset = next((_parse_reset(headers[h]) for h in RESET_HEADERS if h in headers), None)
+        if remaining is not None:
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                remaining = None
+        if remaining is not None:
+            if remaining <= 0 and reset is not None:
+                bucket.pause(reset)
+            else:
+                bucket.limit_remaining(remaining)
+
+        if response.status_code != 429:
+            return None
+
+        bucket.throttled += 1
+        retry_after = _parse_retry_after(headers["retry-after"]) if "retry-after" in headers else None
+        pause = retry_after if retry_after is not None else reset if reset is not None else self.default_backoff
+        bucket.pause(pause)
+        logger.warning(f"Rate limited by {urlsplit(url).netloc}, holding requests for {pause:.1f}s")
+        return pause
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {host: bucket.snapshot() for host, bucket in self._buckets.items()}
@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from config import config
+from utils.codec import encode
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    """
+    One timed operation in a job's trace. Every span of a job shares the trace
+    id derived from its runId, so spans recorded after a restart (a resumed job
+    or a retried callback) land in the same trace.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "run_id", "name", "start", "_started", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], run_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.run_id = run_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: Union[BaseException, str]) -> None:
+        """Mark the span as failed."""
+        self.error = error if isinstance(error, str) else repr(error)
+
+    def end(self) -> None:
+        if _exporter is not None:
+            _exporter.export({
+                "traceId": self.trace_id,
+                "spanId": self.span_id,
+                "parentSpanId": self.parent_id,
+                "runId": self.run_id,
+                "name": self.name,
+                "start": self.start,
+                "duration": time.perf_counter() - self._started,
+                "status": "error" if self.error else "ok",
+                "error": self.error,
+                "attributes": self.attributes
+            })
+
+class _NullSpan(Span):
+    """Stands in for spans while tracing is off, so call sites needn't check."""
+
+    def __init__(self):
+        pass
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def fail(self, error: Union[BaseException, str]) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+# Innermost open span in the current task; child tasks inherit it
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+def trace_id_for(run_id: str) -> str:
+    return hashlib.sha256(run_id.encode()).hexdigest()[:32]
+
+def current() -> Optional[Span]:
+    """The innermost open span, or None."""
+    return _current.get()
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the innermost open span, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+def start_span(name: str, parent: Optional[Span] = None, run_id: Optional[str] = None, **attributes: Any) -> Span:
+    """
+    Start a span under `parent` (default: the current span) without making it
+    current; the caller must end() it. Without a parent it starts the trace of
+    `run_id`, or a fresh trace.
+    """
+    if _exporter is None:
+        return _NULL_SPAN
+    parent = parent or _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, parent.run_id, attributes)
+    trace_id = trace_id_for(run_id) if run_id is not None else f"{random.getrandbits(128):032x}"
+    return Span(name, trace_id, None, run_id, attributes)
+
+@contextmanager
+def span(name: str, parent: Optional[Span] = None, run_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """Time the enclosed block as a span, current for everything it awaits or spawns."""
+    current = start_span(name, parent, run_id, **attributes)
+    if current is _NULL_SPAN:
+        yield current
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+class JsonlExporter:
+    """
+    Appends finished spans to a JSON lines file from a background thread, so
+    ending a span never waits on the disk. Spans are dropped (and counted) when
+    the queue is full. The file is rotated at max_bytes, keeping `backups`
+    older files as path.1 (newest) to path.N.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, queue_size: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write out the spans already queued and stop the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        if self.dropped:
+            logger.warning(f"Dropped {self.dropped} trace spans")
+
+    def export(self, record: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        file = open(self.path, "ab")
+        size = file.tell()
+        stopping = False
+        while not stopping:
+            batch: List[Optional[Dict[str, Any]]] = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            try:
+                for record in batch:
+                    if record is None:
+                        continue
+                    line = encode(record) + b"\n"
+                    if size and size + len(line) > self.max_bytes:
+                        file = self._rotate(file)
+                        size = 0
+                    file.write(line)
+                    size += len(line)
+                file.flush()
+            except Exception as e:
+                logger.error(f"Writing trace spans to {self.path} failed: {e!r}")
+        file.close()
+
+    def _rotate(self, file):
+        file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        return open(self.path, "ab")
+
+_exporter: Optional[JsonlExporter] = None
+
+def start_exporter() -> None:
+    """Start exporting spans if TRACE_ENABLED. Called from the app lifespan."""
+    global _exporter
+    if config.TRACE_ENABLED and _exporter is None:
+        exporter = JsonlExporter(config.TRACE_PATH, config.TRACE_MAX_BYTES, config.TRACE_BACKUPS, config.TRACE_QUEUE_SIZE)
+        exporter.start()
+        _exporter = exporter
+
+def stop_exporter() -> None:
+    """Flush queued spans and stop exporting."""
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.stop()